@@ -27,14 +27,17 @@ by converting the public API of two revisions of a library into a common represe
 (see 'capir.py') which can then be diffed (see 'diff.py') in order to get the new version.
 """
 
+__version__ = "0.4.1"
+
 import os
 import sys
 import logging
 import argparse
 from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
 
-from autobump import config, diff
-from autobump.common import Semver, VersionControlException
+from autobump import cache, config, diff
+from autobump.common import Semver, RestrictedTree, VersionControlException
 from autobump.handlers import hg
 from autobump.handlers import git
 from autobump.handlers import python
@@ -78,19 +81,196 @@ def _patch_types_with_location(units, location):
         _patch_types_with_location(unit.units, location)
 
 
-def evaluate(args, all_revisions):
-    """Run Autobump in evaluation mode."""
-    args.evaluate = False
-    first_revision = args.f
-    last_revision = args.to
-    logger.info("Running in evaluation mode between {} and {}"
-                .format(args.f, args.to))
+def _revision_to_units(revision, vcs_get_commit, lang_handler, args, changed_files=None):
+    """Get a revision and convert it into Units.
 
-    if first_revision not in all_revisions or last_revision not in all_revisions:
-        logger.error("Invalid range, one or more tags not found!")
+    Returns the handle and location of the revision together with the Units,
+    the caller is responsible for calling cleanup() on the handle.
+    If 'changed_files' is given, only those files are looked at."""
+    handle, location = vcs_get_commit(revision)
+    try:
+        if changed_files is not None:
+            location = RestrictedTree(location, changed_files)
+        if lang_handler.build_required:
+            units = lang_handler.codebase_to_units(location, args.build_command, args.build_root)
+        else:
+            units = lang_handler.codebase_to_units(location)
+    except BaseException:
+        handle.cleanup()
+        raise
+    return handle, location, units
+
+
+def _configure_logging(args):
+    """Set the log level requested on the command line."""
+    log_format = "%(levelname)s (%(name)s) - %(message)s"
+    if args.silence:
+        logging.basicConfig(level=logging.ERROR,
+                            format=log_format)
+    elif args.debug:
+        logging.basicConfig(level=logging.DEBUG,
+                            format=log_format)
+    elif args.info:
+        logging.basicConfig(level=logging.INFO,
+                            format=log_format)
+    else:
+        logging.basicConfig(format=log_format)
+    logger.info("Logging enabled")
+
+
+def _identify_handlers(args):
+    """Identify the repository, its VCS and the language handler to use.
+
+    Returns the location of the repository, the VCS handler,
+    the language handler and a function that gets a revision."""
+    # Identify location of repository
+    repo = args.repo or os.getcwd()
+    logger.info("Repository is: {}".format(repo))
+
+    # Identify VCS
+    vcs_handler = _identify_vcs(repo)
+    if vcs_handler is None:
+        logger.error("Failed to identify VCS! Are you running Autobump in the root of the repository?")
         exit(1)
+    logger.info("VCS handler is {}".format(vcs_handler.__name__))
+    vcs_get_commit = partial(vcs_handler.get_commit, repo)
 
-    failed = 0
+    # Identify language
+    handler_map = {
+        "py": python,
+        "python": python,
+        "java_ast": java_ast,
+        "java_native": java_native,
+        "clojure": clojure
+    }
+    lang_handler = handler_map.get(args.handler, None)
+    if lang_handler is None:
+        logger.error("Invalid handler {} specified!".format(args.handler))
+        exit(1)
+    logger.info("Language handler is {}".format(lang_handler.__name__))
+
+    # Avoid checking out revisions if the handler can read
+    # straight from the repository.
+    checkout_free = config.git_checkout_free() and hasattr(vcs_handler, "get_tree")
+    if checkout_free and lang_handler.checkout_required:
+        logger.warning("The {} handler requires a checkout, ignoring git/checkout_free".format(args.handler))
+        checkout_free = False
+    if checkout_free:
+        logger.info("Reading revisions without checking them out")
+        vcs_get_commit = partial(vcs_handler.get_tree, repo)
+    elif cache.checkouts_enabled():
+        logger.info("Using checkout cache in {}".format(config.cache_dir()))
+        # Builds happen inside the checkout, so they get their own copy.
+        vcs_get_commit = partial(cache.get_commit, vcs_handler, repo,
+                                 private=lang_handler.build_required)
+
+    return repo, vcs_handler, lang_handler, vcs_get_commit
+
+
+def _check_build_arguments(args, lang_handler):
+    """Check that a build command and root are given when the handler needs them."""
+    if lang_handler.build_required:
+        logger.info("Handler indicated that a build is required")
+        # Options "--build-command" and "--build-root" should be passed in.
+        if not args.build_command or not args.build_root:
+            logger.error("The {} handler requires that the project is built, but no build command or build root were provided".format(args.handler))
+            exit(1)
+    else:
+        logger.info("Handler indicated no build is required")
+        if args.build_command or args.build_root:
+            logger.warn("No build is required, but build-command or build-root given - IGNORING")
+
+
+def _open_changelog(args):
+    """Return the file the changelog should be written to, or None."""
+    changelog_file = None
+    if args.changelog and not args.changelog_stdout:
+        changelog_file = open(args.changelog, "w")
+        logger.info("Writing changelog to {}".format(args.changelog))
+    elif args.changelog_stdout and not args.changelog:
+        changelog_file = sys.stdout
+        logger.info("Writing changelog to stdout")
+    elif args.changelog and args.changelog_stdout:
+        logger.error("`--changelog` and `--changelog-stdout` are mutually exclusive")
+        exit(1)
+    return changelog_file
+
+
+def _close_changelog(changelog_file):
+    if changelog_file not in {None, sys.stdout}:
+        changelog_file.close()
+        logger.debug("Changelog file closed")
+
+
+def _revisions_to_units(revisions, revision_to_units):
+    """Convert a list of revisions into Units with '_revision_to_units'.
+
+    Returns the handle, location and Units of every revision, in order."""
+    if config.parallel_revisions() and len(revisions) > 1:
+        # The revisions are independent until they are compared,
+        # and most of the time goes to checkouts, builds and
+        # other processes, so threads are enough to overlap them.
+        logger.info("Processing {} revisions concurrently".format(len(revisions)))
+        executor = ThreadPoolExecutor(max_workers=len(revisions))
+        futures = [executor.submit(revision_to_units, revision) for revision in revisions]
+        executor.shutdown(wait=False)
+        wait(futures, return_when=FIRST_EXCEPTION)
+        failed = [future for future in futures if future.done() and future.exception() is not None]
+        if len(failed) > 0:
+            # Report the failure without waiting for the other revisions,
+            # which clean up after themselves if they still succeed.
+            for future in futures:
+                if not future.cancel():
+                    future.add_done_callback(_cleanup_revision)
+            failed[0].result()
+        return [future.result() for future in futures]
+    return [revision_to_units(revision) for revision in revisions]
+
+
+def _cleanup_revision(future):
+    """Clean up the handle of a revision converted by a future, if it was."""
+    if not future.cancelled() and future.exception() is None:
+        handle, _, _ = future.result()
+        handle.cleanup()
+
+
+def _compare_units(a_units, b_units, b_location, lang_handler, args, changelog_file, incremental=False):
+    """Compare the Units of two revisions and return a Bump."""
+    if lang_handler.build_required:
+        # Need to set the 'location' property of all types in both codebases
+        # to the location of the latter one. Comparing types may require
+        # loading compiled components.
+        b_build_location = os.path.join(b_location, args.build_root)
+        _patch_types_with_location(a_units, b_build_location)
+        _patch_types_with_location(b_units, b_build_location)
+
+    logger.debug("Found {} units in variant A".format(len(a_units)))
+    logger.debug("Found {} units in variant B".format(len(b_units)))
+    if (len(a_units) == 0 or len(b_units) == 0) and not incremental:
+        logger.warning("Is the ignore list too restrictive?")
+    bump = diff.compare_codebases(a_units, b_units, changelog_file)
+    logger.info("Bump found to be {}".format(bump))
+    return bump
+
+
+def _later_version(a_revision, bump, from_version=None):
+    """Determine the version of a later revision from the Bump
+    since an earlier revision, whose version is 'from_version'
+    or guessed from its identifier."""
+    a_version = Semver.from_string(from_version) if from_version is not None else Semver.guess_from_string(a_revision)
+    logger.debug("Earlier version is {}".format(a_version))
+    if bump == diff.Bump.major and a_version.major == 0:
+        logger.warning("Found breaking changes, but there's no stable API yet")
+        bump = diff.Bump.minor
+    b_version = a_version.bump(bump)
+    logger.debug("Later version is {}".format(b_version))
+    return b_version
+
+
+def _evaluation_intervals(all_revisions, first_revision, last_revision):
+    """Return the pairs of consecutive revisions between two revisions
+    whose versions should differ."""
+    intervals = []
     for rev_i in range(all_revisions.index(first_revision),
                        all_revisions.index(last_revision)):
         a_revision = all_revisions[rev_i]
@@ -105,21 +285,105 @@ def evaluate(args, all_revisions):
             logger.warning("Omitting interval {} -- {}"
                            .format(a_revision, b_revision))
             continue
+        intervals.append((a_revision, b_revision))
+    return intervals
+
 
-        logger.debug("Evaluating revisions {}...{}"
-                     .format(a_revision, b_revision))
-        setattr(args, "from", a_revision)
-        args.to = b_revision
-        b_version_expected = Semver.guess_from_string(b_revision).drop_label()
-        print("!EVAL Start diffing {} and {}".format(a_revision, b_revision))
-        b_version_actual = autobump(args)
-        print("!EVAL End   diffing {} and {}".format(a_revision, b_revision))
-        if b_version_expected != b_version_actual:
-            logger.debug("Version found differs from name of tag:\n\tReported: {}\n\tFrom tag: {}"
-                         .format(b_version_actual, b_version_expected))
-            print("!EVAL MISMATCH: {a_revision} -- {b_revision} should have been {a_revision} -- {actual}"
-                .format(a_revision=a_revision, b_revision=b_revision, actual=b_version_actual))
-            failed = failed + 1
+def evaluate(args, all_revisions, handlers=None):
+    """Run Autobump in evaluation mode.
+
+    Revisions are converted into Units by a pool of run/evaluate_workers
+    threads, each one once, while the intervals between them are compared
+    in order. At most that many revisions, and no fewer than two, are
+    kept at a time: a revision is read only when there is room for it,
+    and dropped once the intervals it is part of have been compared.
+    'handlers' are as returned by '_identify_handlers',
+    they are identified from 'args' if not given."""
+    first_revision = args.f
+    last_revision = args.to
+    if handlers is None:
+        _configure_logging(args)
+        handlers = _identify_handlers(args)
+    _, _, lang_handler, vcs_get_commit = handlers
+    logger.info("Running in evaluation mode between {} and {}"
+                .format(args.f, args.to))
+
+    if first_revision not in all_revisions or last_revision not in all_revisions:
+        logger.error("Invalid range, one or more tags not found!")
+        exit(1)
+
+    _check_build_arguments(args, lang_handler)
+    if config.incremental():
+        logger.warning("Evaluation mode reads every revision in full, ignoring run/incremental")
+    revision_to_units = partial(_revision_to_units,
+                                vcs_get_commit=vcs_get_commit,
+                                lang_handler=lang_handler,
+                                args=args)
+    intervals = _evaluation_intervals(all_revisions, first_revision, last_revision)
+    # Revisions in the order they are needed, and the last interval needing each.
+    revisions = []
+    last_use = dict()
+    for interval_i, interval in enumerate(intervals):
+        for revision in interval:
+            if revision not in last_use:
+                revisions.append(revision)
+            last_use[revision] = interval_i
+    workers = config.evaluate_workers()
+    most_kept = max(2, workers)
+    logger.info("Evaluating {} intervals, reading {} revision(s) at once"
+                .format(len(intervals), workers))
+
+    changelog_file = _open_changelog(args)
+    failed = 0
+    # Futures of the handle, location and Units of the revisions being kept.
+    kept = dict()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        to_read = iter(revisions)
+        for interval_i, (a_revision, b_revision) in enumerate(intervals):
+            # Revisions are needed in the order they are read,
+            # so both revisions of this interval are being kept.
+            while len(kept) < most_kept:
+                revision = next(to_read, None)
+                if revision is None:
+                    break
+                kept[revision] = executor.submit(revision_to_units, revision)
+
+            logger.debug("Evaluating revisions {}...{}"
+                         .format(a_revision, b_revision))
+            b_version_expected = Semver.guess_from_string(b_revision).drop_label()
+            print("!EVAL Start diffing {} and {}".format(a_revision, b_revision))
+            _, _, a_units = kept[a_revision].result()
+            _, b_location, b_units = kept[b_revision].result()
+            # Comparing is done by this thread alone, as it patches the
+            # locations of types, which the Units of a revision share
+            # between the two intervals it is part of.
+            bump = _compare_units(a_units, b_units, b_location, lang_handler, args, changelog_file)
+            b_version_actual = _later_version(a_revision, bump, args.from_version)
+            # Stop anything the handler left running for this pair of revisions.
+            if hasattr(lang_handler, "shutdown"):
+                lang_handler.shutdown()
+            print("!EVAL End   diffing {} and {}".format(a_revision, b_revision))
+            if b_version_expected != b_version_actual:
+                logger.debug("Version found differs from name of tag:\n\tReported: {}\n\tFrom tag: {}"
+                             .format(b_version_actual, b_version_expected))
+                print("!EVAL MISMATCH: {a_revision} -- {b_revision} should have been {a_revision} -- {actual}"
+                    .format(a_revision=a_revision, b_revision=b_revision, actual=b_version_actual))
+                failed = failed + 1
+
+            for revision in [a_revision, b_revision]:
+                if last_use[revision] == interval_i:
+                    handle, _, _ = kept.pop(revision).result()
+                    handle.cleanup()
+    finally:
+        _close_changelog(changelog_file)
+        for future in kept.values():
+            future.cancel()
+        executor.shutdown(wait=True)
+        for future in kept.values():
+            if not future.cancelled() and future.exception() is None:
+                handle, _, _ = future.result()
+                handle.cleanup()
 
     return failed
 
@@ -205,127 +469,66 @@ $ {0} java --from milestone-foo --from-version 1.1.0 --to milestone-bar
     args = args or parser.parse_args()
     args.f = getattr(args, "from")  # Syntax doesn't allow `args.from`.
 
-    # Set appropriate log level
-    log_format = "%(levelname)s (%(name)s) - %(message)s"
-    if args.silence:
-        logging.basicConfig(level=logging.ERROR,
-                            format=log_format)
-    elif args.debug:
-        logging.basicConfig(level=logging.DEBUG,
-                            format=log_format)
-    elif args.info:
-        logging.basicConfig(level=logging.INFO,
-                            format=log_format)
-    else:
-        logging.basicConfig(format=log_format)
-    logger.info("Logging enabled")
+    _configure_logging(args)
 
     # Export config
     if args.export_config:
         print(config.export_config())
         exit(0)
 
-    # Identify location of repository
-    repo = args.repo or os.getcwd()
-    logger.info("Repository is: {}".format(repo))
-
-    # Identify VCS
-    vcs_handler = _identify_vcs(repo)
-    if vcs_handler is None:
-        logger.error("Failed to identify VCS! Are you running Autobump in the root of the repository?")
-        exit(1)
-    logger.info("VCS handler is {}".format(vcs_handler.__name__))
-    vcs_get_commit = partial(vcs_handler.get_commit, repo)
-    vcs_all_tags = partial(vcs_handler.all_tags, repo)
-    vcs_last_tag = partial(vcs_handler.last_tag, repo)
-    vcs_last_commit = partial(vcs_handler.last_commit, repo)
-
-    # Identify language
-    handler_map = {
-        "py": python,
-        "python": python,
-        "java_ast": java_ast,
-        "java_native": java_native,
-        "clojure": clojure
-    }
-    lang_handler = handler_map.get(args.handler, None)
-    if lang_handler is None:
-        logger.error("Invalid handler {} specified!".format(args.handler))
-        exit(1)
-    logger.info("Language handler is {}".format(lang_handler.__name__))
+    handlers = _identify_handlers(args)
+    repo, vcs_handler, lang_handler, vcs_get_commit = handlers
 
     # Check for evaluation mode
     if args.evaluate:
         if not args.f or not args.to:
             logger.error("Evaluation mode requires supplying a range")
             exit(1)
-        evaluate(args, vcs_all_tags())
+        evaluate(args, vcs_handler.all_tags(repo), handlers)
         exit(0)
 
     # Identify revisions
     try:
-        a_revision = args.f or vcs_last_tag()
+        a_revision = args.f or vcs_handler.last_tag(repo)
         logger.info("Earlier revision identified as {}".format(a_revision))
-        b_revision = args.to or vcs_last_commit()
+        b_revision = args.to or vcs_handler.last_commit(repo)
         logger.info("Later revision identified as {}".format(b_revision))
     except VersionControlException:
         logger.error("Failed to automatically determine comparison range.")
         exit(1)
 
-    # Identify changelog policy
-    changelog_file = None
-    if args.changelog and not args.changelog_stdout:
-        changelog_file = open(args.changelog, "w")
-        logger.info("Writing changelog to {}".format(args.changelog))
-    elif args.changelog_stdout and not args.changelog:
-        changelog_file = sys.stdout
-        logger.info("Writing changelog to stdout")
-    elif args.changelog and args.changelog_stdout:
-        logger.error("`--changelog` and `--changelog-stdout` are mutually exclusive")
-        exit(1)
+    changelog_file = _open_changelog(args)
 
     # Determine bump
-    a_handle, a_location = vcs_get_commit(a_revision)
-    b_handle, b_location = vcs_get_commit(b_revision)
-    if lang_handler.build_required:
-        logger.info("Handler indicated that a build is required")
-        # Options "--build-command" and "--build-root" should be passed in.
-        if not args.build_command or not args.build_root:
-            logger.error("The {} handler requires that the project is built, but no build command or build root were provided".format(args.handler))
-            exit(1)
-        a_units = lang_handler.codebase_to_units(a_location, args.build_command, args.build_root)
-        b_units = lang_handler.codebase_to_units(b_location, args.build_command, args.build_root)
-        # Need to set the 'location' property of all types in both codebases
-        # to the location of the latter one. Comparing types may require
-        # loading compiled components.
-        b_build_location = os.path.join(b_location, args.build_root)
-        _patch_types_with_location(a_units, b_build_location)
-        _patch_types_with_location(b_units, b_build_location)
-    else:
-        logger.info("Handler indicated no build is required")
-        if args.build_command or args.build_root:
-            logger.warn("No build is required, but build-command or build-root given - IGNORING")
-        a_units = lang_handler.codebase_to_units(a_location)
-        b_units = lang_handler.codebase_to_units(b_location)
-
-    logger.debug("Found {} units in variant A".format(len(a_units)))
-    logger.debug("Found {} units in variant B".format(len(b_units)))
-    if len(a_units) == 0 or len(b_units) == 0:
-        logger.warning("Is the ignore list too restrictive?")
-    bump = diff.compare_codebases(a_units, b_units, changelog_file)
-    logger.info("Bump found to be {}".format(bump))
-    if changelog_file not in {None, sys.stdout}:
-        changelog_file.close()
-        logger.debug("Changelog file closed")
+    changed_files = None
+    incremental = config.incremental()
+    if incremental:
+        if not lang_handler.incremental_supported or not hasattr(vcs_handler, "changed_files"):
+            logger.warning("Incremental mode is not supported by the {} handler, ignoring run/incremental".format(args.handler))
+            incremental = False
+        else:
+            # Files that didn't change would produce identical Units
+            # on both sides, so only the changed ones need to be looked at.
+            changed_files = vcs_handler.changed_files(repo, a_revision, b_revision)
+            logger.info("Incremental mode, {} files changed".format(len(changed_files)))
+    _check_build_arguments(args, lang_handler)
+
+    revision_to_units = partial(_revision_to_units,
+                                vcs_get_commit=vcs_get_commit,
+                                lang_handler=lang_handler,
+                                args=args,
+                                changed_files=changed_files)
+    (a_handle, _, a_units), (b_handle, b_location, b_units) = \
+        _revisions_to_units([a_revision, b_revision], revision_to_units)
+    bump = _compare_units(a_units, b_units, b_location, lang_handler, args, changelog_file, incremental)
+    _close_changelog(changelog_file)
 
     # Determine version
-    a_version = Semver.from_string(args.from_version) if args.from_version is not None else Semver.guess_from_string(a_revision)
-    logger.debug("Earlier version is {}".format(a_version))
-    if bump == diff.Bump.major and a_version.major == 0:
-        logger.warning("Found breaking changes, but there's no stable API yet")
-        bump = diff.Bump.minor
-    b_version = a_version.bump(bump)
-    logger.debug("Later version is {}".format(b_version))
+    b_version = _later_version(a_revision, bump, args.from_version)
+
+    # Stop anything the handler left running for this pair of revisions.
+    if hasattr(lang_handler, "shutdown"):
+        lang_handler.shutdown()
 
     # Clean up temporary directories
     a_handle.cleanup()
@@ -0,0 +1,379 @@
+# Copyright 2016-2017 Christian Shtarkov
+#
+# This file is part of Autobump.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+"""
+Persistent caches shared between runs of Autobump:
+checkouts of revisions, results of parsing source files and
+outputs of building source trees.
+
+Everything is kept under the directory given by cache/cache_dir,
+and nothing is cached if that is not set.
+
+Entries are evicted in least-recently-used order once a cache grows
+over its configured size. Several Autobump processes (e.g. parallel CI
+jobs) may use the same cache directory at once: entries are guarded with
+file locks, and an entry that is in use is never evicted.
+"""
+
+import os
+import time
+import fcntl
+import pickle
+import shutil
+import hashlib
+import logging
+import tempfile
+
+from autobump import config
+
+logger = logging.getLogger(__name__)
+
+_megabyte = 1024 * 1024
+# Temporary files older than this are assumed to be left
+# behind by a process that died while writing them.
+_stale_after = 60 * 60
+
+
+def _lock(path, mode):
+    """Open (creating if necessary) a lock file and lock it.
+
+    Returns the open file, closing it releases the lock."""
+    lock_file = open(path, "a")
+    fcntl.flock(lock_file, mode)
+    return lock_file
+
+
+def _try_lock(path, mode):
+    """Same as '_lock', but return None instead of blocking."""
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, mode | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def _tree_size(location):
+    """Return the size in bytes of all files under a directory."""
+    size = 0
+    for root, _, files in os.walk(location):
+        for f in files:
+            path = os.path.join(root, f)
+            if not os.path.islink(path):
+                size += os.path.getsize(path)
+    return size
+
+
+def _sweep_staging(cache_dir):
+    """Remove staging directories left behind by processes that died
+    while populating an entry.
+
+    A staging directory '.staging-name' is only in use while someone
+    holds the populate lock 'name.populate.lock'."""
+    for staging in [f for f in os.listdir(cache_dir) if f.startswith(".staging-")]:
+        name = staging[len(".staging-"):]
+        populate_lock = _try_lock(os.path.join(cache_dir, name + ".populate.lock"), fcntl.LOCK_EX)
+        if populate_lock is None:
+            continue
+        with populate_lock:
+            logger.debug("Removing stale staging directory {}".format(staging))
+            shutil.rmtree(os.path.join(cache_dir, staging), ignore_errors=True)
+
+
+def _evict(cache_dir, entries, max_size):
+    """Remove least recently used entries from a cache directory
+    until the total size is at most 'max_size' bytes.
+
+    'entries' is a list of (name, size) pairs, where the entry itself
+    is at 'cache_dir/name' and is guarded by 'cache_dir/name.lock'."""
+    eviction_lock = _try_lock(os.path.join(cache_dir, ".eviction.lock"), fcntl.LOCK_EX)
+    if eviction_lock is None:
+        # Some other process is already evicting.
+        return
+    with eviction_lock:
+        _sweep_staging(cache_dir)
+        total = sum(size for _, size in entries)
+        entries = sorted(entries, key=lambda e: os.path.getmtime(os.path.join(cache_dir, e[0])))
+        for name, size in entries:
+            if total <= max_size:
+                break
+            entry_lock = _try_lock(os.path.join(cache_dir, name + ".lock"), fcntl.LOCK_EX)
+            if entry_lock is None:
+                # In use by someone else.
+                continue
+            with entry_lock:
+                logger.debug("Evicting {} from cache".format(name))
+                entry = os.path.join(cache_dir, name)
+                # Drop the size file first, so that the entry
+                # is never seen as complete while half-removed.
+                if os.path.exists(entry + ".size"):
+                    os.remove(entry + ".size")
+                if os.path.isdir(entry):
+                    shutil.rmtree(entry, ignore_errors=True)
+                elif os.path.exists(entry):
+                    os.remove(entry)
+            total -= size
+
+
+def _entries_with_sizes(cache_dir):
+    """Return a list of (name, size) of all complete entries in a cache directory."""
+    entries = []
+    for size_file in [f for f in os.listdir(cache_dir) if f.endswith(".size")]:
+        name = size_file[:-len(".size")]
+        try:
+            with open(os.path.join(cache_dir, size_file)) as f:
+                entries.append((name, int(f.read())))
+        except (OSError, ValueError):
+            continue
+    return entries
+
+
+# Checkouts
+class _CachedCheckout(object):
+    """Handle to a checkout in the cache.
+
+    The checkout may not be evicted until cleanup() is called."""
+
+    def __init__(self, lock_file):
+        self.lock_file = lock_file
+
+    def cleanup(self):
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+
+
+def _populate(vcs_handler, repo, commit, cache_dir, name):
+    """Extract a commit into the cache as entry 'name'.
+
+    Must be called with the populate lock of the entry held."""
+    entry = os.path.join(cache_dir, name)
+    staging = os.path.join(cache_dir, ".staging-" + name)
+    shutil.rmtree(staging, ignore_errors=True)
+    os.mkdir(staging)
+    try:
+        vcs_handler.export_commit(repo, commit, staging)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    shutil.rmtree(entry, ignore_errors=True)
+    os.rename(staging, entry)
+    # The size file marks the entry as complete.
+    with open(entry + ".size", "w") as f:
+        f.write(str(_tree_size(entry)))
+
+
+def checkouts_enabled():
+    return config.cache_dir() != "" and config.checkout_cache_size() > 0
+
+
+def get_commit(vcs_handler, repo, revision, private=False):
+    """Get a directory containing a revision, drop-in replacement
+    for the 'get_commit' of a VCS handler.
+
+    The revision is looked up in the checkout cache by its commit id,
+    and extracted there first if it's missing. If 'private' is set,
+    the caller gets a copy of the checkout that it may freely modify,
+    e.g. when building the project.
+
+    The caller is responsible for calling cleanup() on the handle afterwards."""
+    cache_dir = os.path.join(config.cache_dir(), "checkouts")
+    os.makedirs(cache_dir, exist_ok=True)
+    vcs_name = vcs_handler.__name__.split(".")[-1]
+    commit = vcs_handler.resolve_commit(repo, revision)
+    name = "{}-{}".format(vcs_name, commit)
+    entry = os.path.join(cache_dir, name)
+
+    # A shared lock on the entry is held for as long as the checkout
+    # is in use, which keeps it from being evicted. Populating a missing
+    # entry is serialised through a separate lock, so that users of
+    # an existing entry never have to wait for each other.
+    lock_file = _lock(entry + ".lock", fcntl.LOCK_SH)
+    try:
+        if os.path.exists(entry + ".size"):
+            logger.info("Found {} in checkout cache".format(revision))
+        else:
+            with _lock(entry + ".populate.lock", fcntl.LOCK_EX):
+                # Someone else may have populated it while we waited.
+                if not os.path.exists(entry + ".size"):
+                    logger.info("Adding {} to checkout cache".format(revision))
+                    _populate(vcs_handler, repo, commit, cache_dir, name)
+        os.utime(entry)
+    except Exception:
+        lock_file.close()
+        raise
+
+    _evict(cache_dir, _entries_with_sizes(cache_dir), config.checkout_cache_size() * _megabyte)
+
+    if private:
+        temp_dir_handle = tempfile.TemporaryDirectory()
+        checkout_dir = os.path.join(temp_dir_handle.name, os.path.basename(os.path.abspath(repo)))
+        try:
+            shutil.copytree(entry, checkout_dir, symlinks=True)
+        finally:
+            lock_file.close()
+        return temp_dir_handle, checkout_dir
+    return _CachedCheckout(lock_file), entry
+
+
+# Parse results
+def units_enabled():
+    return config.cache_dir() != "" and config.unit_cache_size() > 0
+
+
+def unit_key(handler, source, *settings):
+    """Return the cache key of the result of parsing 'source' (text)
+    with some handler, under the handler-relevant configuration 'settings'.
+
+    The version of Autobump is part of the key, so that upgrading
+    it invalidates everything cached by older versions."""
+    import autobump
+    digest = hashlib.sha1()
+    digest.update(repr((autobump.__version__, handler, settings)).encode("utf-8"))
+    digest.update(source.encode("utf-8", errors="surrogateescape"))
+    return digest.hexdigest()
+
+
+def _unit_path(key):
+    return os.path.join(config.cache_dir(), "units", key[:2], key)
+
+
+def load_unit(key):
+    """Return the object cached under 'key', or None if there isn't one."""
+    path = _unit_path(key)
+    try:
+        with open(path, "rb") as f:
+            obj = pickle.load(f)
+        os.utime(path)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, TypeError):
+        return None
+    return obj
+
+
+def store_unit(key, obj):
+    """Cache an object under 'key'."""
+    path = _unit_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Entries never change once written, so writing to a temporary
+    # file and renaming it is enough to be safe from concurrent readers.
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix=".tmp-", delete=False) as f:
+        pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(f.name, path)
+
+
+def evict_units():
+    """Evict least recently used parse results until the cache
+    fits into cache/unit_cache_size."""
+    cache_dir = os.path.join(config.cache_dir(), "units")
+    if not os.path.isdir(cache_dir):
+        return
+    eviction_lock = _try_lock(os.path.join(cache_dir, ".eviction.lock"), fcntl.LOCK_EX)
+    if eviction_lock is None:
+        return
+    with eviction_lock:
+        now = time.time()
+        entries = []
+        for root, _, files in os.walk(cache_dir):
+            for f in files:
+                if f.endswith(".lock"):
+                    continue
+                path = os.path.join(root, f)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if f.startswith(".tmp-"):
+                    if now - stat.st_mtime > _stale_after:
+                        os.remove(path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        max_size = config.unit_cache_size() * _megabyte
+        for _, size, path in sorted(entries):
+            if total <= max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+# Build outputs
+def builds_enabled():
+    return config.cache_dir() != "" and config.build_cache_size() > 0
+
+
+def build_key(location, *settings):
+    """Return the cache key of the output of building the source tree
+    at 'location', under the build-relevant 'settings' (build command etc.).
+
+    Must be called before building, as the key depends on the
+    contents of every file in the tree."""
+    digest = hashlib.sha1()
+    digest.update(repr(settings).encode("utf-8"))
+    for root, dirs, files in os.walk(location):
+        dirs.sort()
+        for f in sorted(files):
+            path = os.path.join(root, f)
+            digest.update(os.path.relpath(path, location).encode("utf-8", errors="surrogateescape") + b"\0")
+            if os.path.islink(path):
+                digest.update(os.readlink(path).encode("utf-8", errors="surrogateescape"))
+            else:
+                with open(path, "rb") as source:
+                    for block in iter(lambda: source.read(_megabyte), b""):
+                        digest.update(block)
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def load_build(key, build_root):
+    """Copy the build output cached under 'key' to the directory 'build_root'.
+
+    Returns False (leaving 'build_root' alone) if there isn't one."""
+    cache_dir = os.path.join(config.cache_dir(), "builds")
+    os.makedirs(cache_dir, exist_ok=True)
+    entry = os.path.join(cache_dir, key)
+    # Holding the entry lock keeps it from being evicted while copying.
+    with _lock(entry + ".lock", fcntl.LOCK_SH):
+        if not os.path.exists(entry + ".size"):
+            return False
+        logger.info("Found build output in build cache")
+        shutil.rmtree(build_root, ignore_errors=True)
+        shutil.copytree(entry, build_root, symlinks=True)
+        os.utime(entry)
+    return True
+
+
+def store_build(key, build_root):
+    """Cache a copy of the directory 'build_root' under 'key'."""
+    cache_dir = os.path.join(config.cache_dir(), "builds")
+    os.makedirs(cache_dir, exist_ok=True)
+    entry = os.path.join(cache_dir, key)
+    with _lock(entry + ".populate.lock", fcntl.LOCK_EX):
+        # Someone else may have built the same tree at the same time.
+        if not os.path.exists(entry + ".size"):
+            logger.info("Adding build output to build cache")
+            staging = os.path.join(cache_dir, ".staging-" + key)
+            shutil.rmtree(staging, ignore_errors=True)
+            shutil.copytree(build_root, staging, symlinks=True)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.rename(staging, entry)
+            # The size file marks the entry as complete.
+            with open(entry + ".size", "w") as f:
+                f.write(str(_tree_size(entry)))
+    _evict(cache_dir, _entries_with_sizes(cache_dir), config.build_cache_size() * _megabyte)
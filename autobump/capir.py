@@ -25,15 +25,81 @@ This is the only thing that the diffing algorithm (diff.py)
 can operate on.
 """
 
-import uuid
+import sys
+import hashlib
+import itertools
+
+# Numbers the names of types that weren't given one.
+_anonymous_types = itertools.count()
+# Maps entity classes to the names of all slots they have.
+_slots_of_class = dict()
+
+
+def _hash(digests):
+    """Hash the digests of the parts of an entity into its own digest.
+
+    Identical digests are taken to mean that entities are identical, so
+    this uses a cryptographic hash rather than 'hash', whose collisions
+    would hide changes."""
+    return hashlib.sha1(repr(digests).encode("utf-8")).digest()
+
+
+def _slots(cls):
+    """Return the names of all attributes declared in the '__slots__'
+    of a class and its ancestors, as a pair of tuples of the public
+    and the private ones. Private slots (e.g. a cached digest) aren't
+    part of the entity, and are reset to None when it is unpickled."""
+    slots = _slots_of_class.get(cls, None)
+    if slots is None:
+        public, private = [], []
+        for ancestor in reversed(cls.__mro__):
+            for slot in ancestor.__dict__.get("__slots__", ()):
+                if slot in public or slot in private:
+                    continue
+                (private if slot.startswith("_") else public).append(slot)
+        slots = (tuple(public), tuple(private))
+        _slots_of_class[cls] = slots
+    return slots
 
 
 class Entity(object):
-    """Generic entity."""
+    """Generic entity.
+
+    Large codebases consist of millions of entities, so they keep their
+    attributes in '__slots__' instead of a '__dict__'. Subclasses may
+    still add attributes freely by not declaring '__slots__' themselves.
+
+    Every entity has a structural digest: if the digests of two versions
+    of an entity match, comparing them finds no changes at all.
+    Units, functions and signatures hash theirs lazily and keep it,
+    so they must not be modified after 'digest' was first called.
+    Digests are only meaningful within one process, and aren't pickled."""
+    __slots__ = ()
+
+    def digest(self):
+        raise NotImplementedError()
+
+    def __getstate__(self):
+        return None, self.attributes()
+
+    def __setstate__(self, state):
+        _, attributes = state
+        for name in _slots(type(self))[1]:
+            setattr(self, name, None)
+        for name, value in attributes.items():
+            setattr(self, name, value)
+
+    def attributes(self):
+        """Return a dictionary of all attributes of the entity."""
+        attributes = {name: getattr(self, name)
+                      for name in _slots(type(self))[0]
+                      if hasattr(self, name)}
+        attributes.update(getattr(self, "__dict__", {}))
+        return attributes
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            return self.attributes() == other.attributes()
         raise TypeError("Comparing entity to something else.")
 
     def __ne__(self, other):
@@ -50,31 +116,54 @@ class Type(Entity):
     Most importantly, they should implement the 'is_compatible' method
     appropriately so that types can be compared to other types.
     """
+    __slots__ = ("name",)
 
     def __init__(self):
-        self.name = str(uuid.uuid4())
+        # Each one is distinct from all other types.
+        self.name = "<type {}>".format(next(_anonymous_types))
 
     def is_compatible(self, other):
         """Checks whether 'self' can substitute 'other'."""
         return isinstance(self, type(other))
 
+    @classmethod
+    def prefetch_compatibility(cls, pairs):
+        """Called with all (a, b) pairs of types for which 'a.is_compatible(b)'
+        may be asked while comparing two codebases.
+
+        Handlers whose compatibility checks are expensive can override
+        this to resolve them all at once. Does nothing by default."""
+        pass
+
     def __eq__(self, other):
         return self.is_compatible(other) and self.name == other.name
 
     def __hash__(self):
         return hash(self.name)
 
+    def digest(self):
+        """Types of the same class and name are considered the same.
+
+        Handlers whose types differ in other ways as well need to override this.
+        Digests of types, fields and parameters are plain tuples, which are
+        cheap to build and get hashed as part of their parent anyway."""
+        return (type(self), self.name)
+
 
 class Field(Entity):
     """Top-level accessible field.
 
     This can be used to model module constants,
     class fields, and other similar public pieces of data."""
+    __slots__ = ("name", "type")
 
     def __init__(self, name, type):
-        self.name = name
+        self.name = sys.intern(name)
         self.type = type
 
+    def digest(self):
+        return (self.name, self.type.digest())
+
 
 class Parameter(Entity):
     """Parameter to a function.
@@ -82,12 +171,17 @@ class Parameter(Entity):
     Has a type and default value, where the exact value of the
     default value is irrelevant: it only matters whether there is one.
     """
+    __slots__ = ("name", "type", "default_value")
 
     def __init__(self, name, type, default_value=None):
-        self.name = name
+        self.name = sys.intern(name)
         self.type = type
         self.default_value = default_value
 
+    def digest(self):
+        # Only the presence of a default value matters when comparing.
+        return (self.name, self.type.digest(), self.default_value is not None)
+
     def __hash__(self):
         return hash((self.name, self.type))
 
@@ -104,11 +198,18 @@ class Signature(Entity):
     Essentially a collection of parameters. Functions can have
     multiple signatures to model things like overloading.
     """
+    __slots__ = ("parameters", "_digest")
 
     def __init__(self, parameters=None):
         if parameters is None:
             parameters = []
         self.parameters = parameters
+        self._digest = None
+
+    def digest(self):
+        if self._digest is None:
+            self._digest = _hash(tuple([p.digest() for p in self.parameters]))
+        return self._digest
 
     def __hash__(self):
         return hash(tuple(self.parameters))
@@ -126,13 +227,22 @@ class Function(Entity):
     Can be used to represent any callable piece of code,
     like functions, macros, methods and so on.
     """
+    __slots__ = ("name", "type", "signatures", "_digest")
 
     def __init__(self, name, type, signatures=None):
-        self.name = name
+        self.name = sys.intern(name)
         self.type = type
         self.signatures = signatures
         if self.signatures is None:
             self.signatures = []
+        self._digest = None
+
+    def digest(self):
+        if self._digest is None:
+            # Overloads are compared irrespective of their order.
+            self._digest = _hash((self.name, self.type.digest(),
+                                  tuple(sorted([s.digest() for s in self.signatures]))))
+        return self._digest
 
 
 class Unit(Entity):
@@ -140,9 +250,19 @@ class Unit(Entity):
 
     Could be a Java class, a Python module, a C translation unit and so on.
     """
+    __slots__ = ("name", "fields", "functions", "units", "_digest")
 
     def __init__(self, name, fields, functions, units):
-        self.name = name
+        self.name = sys.intern(name)
         self.fields = fields
         self.functions = functions
         self.units = units
+        self._digest = None
+
+    def digest(self):
+        if self._digest is None:
+            self._digest = _hash((self.name,
+                                  tuple([(k, v.digest()) for k, v in sorted(self.fields.items())]),
+                                  tuple([(k, v.digest()) for k, v in sorted(self.functions.items())]),
+                                  tuple([(k, v.digest()) for k, v in sorted(self.units.items())])))
+        return self._digest
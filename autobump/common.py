@@ -18,11 +18,13 @@
 Common classes and functions used throughout Autobump.
 """
 
+import os
 import re
 import logging
 import subprocess
+from concurrent.futures import ProcessPoolExecutor
 
-from autobump import diff
+from autobump import config, diff
 
 logger = logging.getLogger(__name__)
 
@@ -125,3 +127,75 @@ def popen(args, cwd="."):
     return (child.returncode,
             stdout_data.decode("ascii").strip(),
             stderr_data.decode("ascii").strip())
+
+
+def parallel_map(function, items, workers, chunksize=1):
+    """Lazily yield 'function' applied to every item, in order.
+
+    With more than one worker, items are processed by a pool of
+    processes, so 'function' must be a module-level function and
+    both items and results must be picklable. Workers start with
+    the configuration of the calling process."""
+    if workers <= 1 or len(items) <= 1:
+        yield from map(function, items)
+        return
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=config.restore,
+                             initargs=(config.snapshot(),)) as executor:
+        yield from executor.map(function, items, chunksize=chunksize)
+
+
+def walk(location):
+    """Walk a codebase top-down in the same manner as os.walk.
+
+    'location' is either a directory or a tree object handed out by a
+    VCS handler (see 'handlers/git.py'), so that handlers can read a
+    revision without it being checked out first."""
+    if isinstance(location, str):
+        return os.walk(location)
+    return location.walk()
+
+
+def read_source(location, path):
+    """Return the decoded contents of a file found by 'walk'."""
+    if isinstance(location, str):
+        with open(path, "rb") as f:
+            data = f.read()
+    else:
+        data = location.read(path)
+    return data.decode("utf-8", errors="replace")
+
+
+class RestrictedTree(object):
+    """View of a codebase that only contains some of its files.
+
+    'paths' are relative to the root of the codebase, with directories
+    that contain none of them left out of the walk altogether."""
+
+    def __init__(self, location, paths):
+        self.location = location
+        self.paths = {os.path.normpath(p) for p in paths}
+        self.dirs = set()
+        for path in self.paths:
+            parent = os.path.dirname(path)
+            while parent != "":
+                self.dirs.add(parent)
+                parent = os.path.dirname(parent)
+
+    def _relative(self, root):
+        if isinstance(self.location, str):
+            root = os.path.relpath(root, self.location)
+        return "" if root in {"", "."} else os.path.normpath(root)
+
+    def walk(self):
+        for root, dirs, files in walk(self.location):
+            relative_root = self._relative(root)
+            dirs[:] = [d for d in dirs if os.path.join(relative_root, d) in self.dirs]
+            files = [f for f in files if os.path.join(relative_root, f) in self.paths]
+            yield root, dirs, files
+
+    def read(self, path):
+        if isinstance(self.location, str):
+            with open(path, "rb") as f:
+                return f.read()
+        return self.location.read(path)
@@ -29,6 +29,7 @@ the context manager and decorator defined here.
 
 import os
 import re
+import fnmatch
 import logging
 import configparser
 from io import StringIO
@@ -47,6 +48,25 @@ defaults = {
         "javac": "javac"
     },
 
+    "run": {
+        "incremental": False,
+        "parallel_revisions": False,
+        "parse_workers": 1,
+        "parse_chunksize": 16,
+        "evaluate_workers": 1
+    },
+
+    "git": {
+        "checkout_free": False
+    },
+
+    "cache": {
+        "cache_dir": "",
+        "checkout_cache_size": 2048,
+        "unit_cache_size": 512,
+        "build_cache_size": 1024
+    },
+
     "only_consider": {
         "files": [],
         "dirs": [],
@@ -66,27 +86,35 @@ defaults = {
     },
 
     "java_native": {
-        "classpath": ""
+        "classpath": "",
+        "type_checker_server": True,
+        "batch_type_checks": True,
+        "inspector_format": "xml",
+        "inspector_processes": 1
     },
 
     "java_ast": {
         "error_on_external_types": True,
-        "omit_on_error": False
+        "omit_on_error": False,
+        "declarations_only": False
     },
 
     "clojure": {
         "classpath": "",
-        "omit_on_error": False
+        "omit_on_error": False,
+        "inspector_processes": 1
     },
 }
 _cached = dict()
 _configparser = None
+# Changes whenever values are overriden, see 'ignored'.
+_generation = 0
 
 
 def _value_to_string(value):
     if isinstance(value, list):
         return '\n'.join(value)
-    if isinstance(value, bool):
+    if isinstance(value, (bool, int)):
         return str(value)
     return value
 
@@ -130,8 +158,7 @@ def get(category, name):
     if _falsy.match(str(value)):
         value = False
 
-    logger.info("{}/{} is {}"
-                .format(category, name, (value if value != "" else "not set")))
+    logger.info("%s/%s is %s", category, name, value if value != "" else "not set")
 
     _cached[(category, name)] = value
     return value
@@ -157,8 +184,9 @@ class config_overrides(object):
                 set(category, name, self.overrides[category][name])
 
     def __exit__(self, *args):
-        global _cached
+        global _cached, _generation
         _cached = deepcopy(self.previous)
+        _generation += 1
 
 
 def config_override(category, name, value):
@@ -174,8 +202,21 @@ def config_override(category, name, value):
 
 def set(category, name, value):
     """Permanently override the value of an option."""
-    global _cached
+    global _cached, _generation
     _cached[(category, name)] = value
+    _generation += 1
+
+
+def snapshot():
+    """Return the values of all parameters looked up or overriden so far."""
+    return dict(_cached)
+
+
+def restore(values):
+    """Apply a snapshot, e.g. in a worker process
+    that did not inherit the state of its parent."""
+    for (category, name), value in values.items():
+        set(category, name, value)
 
 
 # autobump
@@ -187,21 +228,98 @@ clojure = _make_get("autobump", "clojure")
 java = _make_get("autobump", "java")
 javac = _make_get("autobump", "javac")
 
+# run
+incremental = _make_get("run", "incremental")
+parallel_revisions = _make_get("run", "parallel_revisions")
+
+
+def parse_workers():
+    """Number of processes to parse files with."""
+    return int(get("run", "parse_workers"))
+
+
+def parse_chunksize():
+    """Number of files handed to a parsing process at a time."""
+    return max(1, int(get("run", "parse_chunksize")))
+
+
+def evaluate_workers():
+    """Number of revisions to read at once in evaluation mode."""
+    return max(1, int(get("run", "evaluate_workers")))
+
+
+# git
+git_checkout_free = _make_get("git", "checkout_free")
+
+
+# cache
+cache_dir = _make_get("cache", "cache_dir")
+
+
+def checkout_cache_size():
+    """Maximum size of the checkout cache in megabytes."""
+    return int(get("cache", "checkout_cache_size"))
+
+
+def unit_cache_size():
+    """Maximum size of the parse result cache in megabytes."""
+    return int(get("cache", "unit_cache_size"))
+
+
+def build_cache_size():
+    """Maximum size of the build output cache in megabytes."""
+    return int(get("cache", "build_cache_size"))
+
 
 # ignore
+class _Matcher(object):
+    """Matches names against a list of patterns, which are either
+    names, shell-style wildcards (if prefixed with 'glob:')
+    or regular expressions (if prefixed with 're:')."""
+
+    def __init__(self, patterns):
+        if isinstance(patterns, str):
+            patterns = patterns.splitlines()
+        self.empty = len(patterns) == 0
+        literals = []
+        expressions = []
+        for pattern in patterns:
+            if pattern.startswith("re:"):
+                expressions.append(pattern[len("re:"):])
+            elif pattern.startswith("glob:"):
+                expressions.append(fnmatch.translate(pattern[len("glob:"):]))
+            else:
+                literals.append(pattern)
+        self.literals = frozenset(literals)
+        # All expressions are combined into one.
+        self.expression = None
+        if len(expressions) > 0:
+            self.expression = re.compile("|".join("(?:{})".format(e) for e in expressions))
+
+    def matches(self, name):
+        if name in self.literals:
+            return True
+        return self.expression is not None and self.expression.fullmatch(name) is not None
+
+
+# Maps what is ignored (files, dirs or entities) to the generation
+# they were built in and the matchers of only_consider and ignore.
+_matchers = dict()
+
+
 def ignored(what, name):
     """Check whether something should be ignored."""
-    only_consider_lit = get("only_consider", what)
-    ignored_lit = get("ignore", what)
-    if isinstance(only_consider_lit, str):
-        only_consider_lit = only_consider_lit.splitlines()
-    if isinstance(ignored_lit, str):
-        ignored_lit = ignored_lit.splitlines()
+    generation, only_consider, ignore = _matchers.get(what, (None, None, None))
+    if generation != _generation:
+        generation = _generation
+        only_consider = _Matcher(get("only_consider", what))
+        ignore = _Matcher(get("ignore", what))
+        _matchers[what] = (generation, only_consider, ignore)
 
-    if len(only_consider_lit) > 0:
-        return name not in only_consider_lit
+    if not only_consider.empty:
+        return not only_consider.matches(name)
 
-    return name in ignored_lit
+    return ignore.matches(name)
 
 
 def file_ignored(name):
@@ -234,10 +352,26 @@ def java_classpath():
     return (value + ":.:") if value != "" else ""
 
 
+java_type_checker_server = _make_get("java_native", "type_checker_server")
+java_batch_type_checks = _make_get("java_native", "batch_type_checks")
+java_inspector_format = _make_get("java_native", "inspector_format")
+
+
+def java_inspector_processes():
+    """Number of Inspector processes to run at once."""
+    return int(get("java_native", "inspector_processes"))
+
+
 # java_ast
 java_error_on_external_types = _make_get("java_ast", "error_on_external_types")
 java_omit_on_error = _make_get("java_ast", "omit_on_error")
+java_declarations_only = _make_get("java_ast", "declarations_only")
 
 # clojure
 clojure_classpath = _make_get("clojure", "classpath")
 clojure_omit_on_error = _make_get("clojure", "omit_on_error")
+
+
+def clojure_inspector_processes():
+    """Number of inspector processes to run at once."""
+    return int(get("clojure", "inspector_processes"))
@@ -89,8 +89,9 @@ def _compare_types(a_ent, b_ent):
     """Compare types of two entities and return a list of Changes."""
     changes = []
     if a_ent.type != b_ent.type:
-        logger.debug("Types are different for {} and {}:\n\tVariant A: {}\n\tVariant B: {}"
-                     .format(a_ent, b_ent, a_ent.type, b_ent.type))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Types are different for %s and %s:\n\tVariant A: %s\n\tVariant B: %s",
+                         a_ent, b_ent, a_ent.type, b_ent.type)
         if b_ent.type.is_compatible(a_ent.type):
             logger.debug("Furthermore, types are compatible")
             changes.append(Change.type_changed_to_compatible_type)
@@ -103,8 +104,9 @@ def _compare_types(a_ent, b_ent):
 def _compare_signatures(a_ent, b_ent):
     """Compare signatures of two entities and return a list of Changes."""
     changes = []
-    logger.debug("Comparing signatures of {} and {}\n\tVariant A: {}\n\tVariant B: {}"
-                 .format(a_ent, b_ent, str(a_ent.signatures), str(b_ent.signatures)))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Comparing signatures of %s and %s\n\tVariant A: %s\n\tVariant B: %s",
+                     a_ent, b_ent, a_ent.signatures, b_ent.signatures)
 
     if len(a_ent.signatures) == 1 and len(b_ent.signatures) == 1:
         return _compare_signatures_directly(a_ent.signatures[0], b_ent.signatures[0])
@@ -115,10 +117,7 @@ def _compare_signatures(a_ent, b_ent):
         logger.debug("Variant B has less signatures")
         changes.append(Change.overloaded_function_removed)
 
-    a_signatures = set(a_ent.signatures)
-    b_signatures = set(b_ent.signatures)
-    not_in_b = a_signatures.difference(b_signatures)
-    not_in_a = b_signatures.difference(a_signatures)
+    not_in_b, not_in_a = _changed_overloads(a_ent, b_ent)
     compat_signatures = set()
     for a_sig in not_in_b:
         for b_sig in not_in_a:
@@ -128,8 +127,7 @@ def _compare_signatures(a_ent, b_ent):
                 compat_signatures.add(a_sig)
                 compat_signatures.add(b_sig)
     if len(compat_signatures) > 0:
-        logger.debug("There were some different, but compatible signatures\n\t{}"
-                     .format(str(compat_signatures)))
+        logger.debug("There were some different, but compatible signatures\n\t%s", compat_signatures)
     not_in_a = not_in_a.difference(compat_signatures)
     not_in_b = not_in_b.difference(compat_signatures)
     for signature in not_in_a:
@@ -142,6 +140,14 @@ def _compare_signatures(a_ent, b_ent):
     return changes
 
 
+def _changed_overloads(a_ent, b_ent):
+    """Return the signatures of an entity that are only in variant A,
+    and those that are only in variant B."""
+    a_signatures = set(a_ent.signatures)
+    b_signatures = set(b_ent.signatures)
+    return a_signatures.difference(b_signatures), b_signatures.difference(a_signatures)
+
+
 def _compare_signatures_directly(a_signature, b_signature):
     """Compare two Signature objects directly and return a list of Changes."""
     changes = []
@@ -156,13 +162,12 @@ def _compare_signatures_directly(a_signature, b_signature):
     # Check whether size of signature has changed
     if len(a_parameters) < len(b_parameters):
         # Signature was expanded - check for default values.
-        logger.debug("Signature was expanded in later version: {} became {}"
-                     .format(len(a_parameters), len(b_parameters)))
+        logger.debug("Signature was expanded in later version: %d became %d",
+                     len(a_parameters), len(b_parameters))
         all_new_have_defaults = True
         for pi in range(len(a_parameters), len(b_parameters)):
             if b_parameters[pi].default_value is None:
-                logger.debug("At least one new parameter missing default value: {}"
-                             .format(b_parameters[pi]))
+                logger.debug("At least one new parameter missing default value: %s", b_parameters[pi])
                 all_new_have_defaults = False
                 break
         if all_new_have_defaults:
@@ -173,8 +178,8 @@ def _compare_signatures_directly(a_signature, b_signature):
             changes.append(Change.parameter_added_to_signature)
     elif len(a_parameters) > len(b_parameters):
         # Signature has shrunk - always a breaking change.
-        logger.debug("Signature has shrunk in later version: {} became {}"
-                     .format(len(a_parameters), len(b_parameters)))
+        logger.debug("Signature has shrunk in later version: %d became %d",
+                     len(a_parameters), len(b_parameters))
         changes.append(Change.parameter_removed_from_signature)
 
     return changes
@@ -190,12 +195,17 @@ def _compare_entities(a_ent, b_ent, changelog_file, path=""):
     assert type(a_ent) is type(b_ent), "Shouldn't compare entities of different types."
 
     path = _join_path(path, a_ent.name)
-    logger.debug("Comparing {}" .format(path))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Comparing %s", path)
 
     if config.entity_ignored(path) and a_ent.name != "":
         logger.debug("Ignoring because of configuration")
         return Bump.patch
 
+    if a_ent.digest() == b_ent.digest():
+        logger.debug("Identical, skipping")
+        return Bump.patch
+
     highestBump = Bump.patch  # Biggest bump encountered so far.
 
     def _report_change(change, path):
@@ -222,23 +232,25 @@ def _compare_entities(a_ent, b_ent, changelog_file, path=""):
                 _report_change(change, path)
 
     # Compare inner entities recursively
-    for k, v in a_ent.__dict__.items():
+    a_attributes = a_ent.attributes()
+    b_attributes = b_ent.attributes()
+    for k, v in a_attributes.items():
         if type(v) is not dict:
             continue
-        assert k in b_ent.__dict__, "Should never happen: comparing entities with different inner entities."
-        a_inner = a_ent.__dict__[k]
-        b_inner = b_ent.__dict__[k]
+        assert k in b_attributes, "Should never happen: comparing entities with different inner entities."
+        a_inner = a_attributes[k]
+        b_inner = b_attributes[k]
         for ki in {**a_inner, **b_inner}:
 
             if ki not in a_inner:
                 # Handle case when a entity was added.
-                logger.debug("Not found in variant A: {}".format(b_inner[ki].name))
+                logger.debug("Not found in variant A: %s", b_inner[ki].name)
                 _report_change(Change.entity_was_introduced, _join_path(path, b_inner[ki].name))
                 continue
 
             if ki not in b_inner:
                 # Handle case when a entity was removed.
-                logger.debug("Not found in variant B: {}".format(a_inner[ki].name))
+                logger.debug("Not found in variant B: %s", a_inner[ki].name)
                 _report_change(Change.entity_was_removed, _join_path(path, a_inner[ki].name))
                 continue
 
@@ -248,6 +260,51 @@ def _compare_entities(a_ent, b_ent, changelog_file, path=""):
     return highestBump
 
 
+def _compared_types(a_ent, b_ent):
+    """Yield the pair of types (b, a) of two versions of an entity
+    for which '_compare_types' asks 'b.is_compatible(a)'."""
+    if a_ent.type != b_ent.type:
+        yield b_ent.type, a_ent.type
+
+
+def _type_pairs(a_ent, b_ent, path=""):
+    """Yield all pairs of types (a, b) in two versions of an entity
+    for which '_compare_entities' asks 'a.is_compatible(b)'."""
+    path = _join_path(path, a_ent.name)
+    if config.entity_ignored(path) and a_ent.name != "":
+        return
+    if a_ent.digest() == b_ent.digest():
+        return
+    if hasattr(a_ent, "type"):
+        yield from _compared_types(a_ent, b_ent)
+    if hasattr(a_ent, "signatures"):
+        if len(a_ent.signatures) == 1 and len(b_ent.signatures) == 1:
+            signature_pairs = [(a_ent.signatures[0], b_ent.signatures[0])]
+        else:
+            # Only overloads missing from the other variant are compared.
+            not_in_b, not_in_a = _changed_overloads(a_ent, b_ent)
+            signature_pairs = [(a_signature, b_signature) for a_signature in not_in_b for b_signature in not_in_a]
+        for a_signature, b_signature in signature_pairs:
+            for a_parameter, b_parameter in zip(a_signature.parameters, b_signature.parameters):
+                yield from _compared_types(a_parameter, b_parameter)
+    b_attributes = b_ent.attributes()
+    for k, a_inner in a_ent.attributes().items():
+        if type(a_inner) is not dict:
+            continue
+        b_inner = b_attributes[k]
+        for ki in a_inner.keys() & b_inner.keys():
+            yield from _type_pairs(a_inner[ki], b_inner[ki], path)
+
+
+def _prefetch_compatibility(a_unit, b_unit):
+    """Let every type class know what it will be asked about."""
+    pairs = dict()
+    for a_type, b_type in _type_pairs(a_unit, b_unit):
+        pairs.setdefault(type(a_type), []).append((a_type, b_type))
+    for type_class, type_pairs in pairs.items():
+        type_class.prefetch_compatibility(type_pairs)
+
+
 def compare_codebases(a_units, b_units, changelog_file):
     """Compare codebases consisting of Units.
 
@@ -256,4 +313,5 @@ def compare_codebases(a_units, b_units, changelog_file):
     # Represent both codebases as a single unit, and compare that.
     a_unit = Unit("", dict(), dict(), a_units)
     b_unit = Unit("", dict(), dict(), b_units)
+    _prefetch_compatibility(a_unit, b_unit)
     return _compare_entities(a_unit, b_unit, changelog_file)
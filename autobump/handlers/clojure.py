@@ -23,8 +23,10 @@ by configuring the Clojure executable to be 'lein exec' or something similar.
 """
 
 import os
+import sys
 import string
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from autobump import config
 from autobump.capir import Type, Field, Parameter, Signature, Function, Unit
@@ -37,8 +39,10 @@ _source_file_ext = ".clj"
 
 
 class _ClojureType(Type):
+    __slots__ = ("supers",)
+
     def __init__(self, name, supers):
-        self.name = name
+        self.name = sys.intern(name)
         self.supers = supers
 
     def is_compatible(self, other):
@@ -66,17 +70,41 @@ class _SexpReadException(Exception):
     pass
 
 
-def _run_inspector(file, repo):
-    """Runs the utility program inspector.clj for a file, with
+def _run_inspector(files, repo):
+    """Runs the utility program inspector.clj for a list of files, with
     the working directory set to 'repo'."""
-    arglist = [config.clojure(), inspector_clj, file]
-    logger.debug("Running inspector as follows: " + ' '.join(arglist))
+    arglist = [config.clojure(), inspector_clj] + files
+    logger.debug("Running inspector as follows: %s", ' '.join(arglist))
     return_code, stdout, stderr = popen(arglist, cwd=repo)
     if return_code != 0:
         raise _ClojureUtilityException(stderr)
     return stdout
 
 
+def _inspect_files(files, repo):
+    """Convert a list of files into Units with a single run
+    of the inspector.
+
+    If that fails and clojure/omit_on_error is set, inspect each
+    file on its own, so that only the ones that fail are left out."""
+    try:
+        return _sexp_read(_run_inspector(files, repo))
+    except _ClojureUtilityException:
+        if len(files) == 1:
+            logger.warn("File %s failed to parse", files[0])
+        else:
+            logger.warn("Inspecting %d files at once failed", len(files))
+        if not config.clojure_omit_on_error():
+            raise
+        if len(files) == 1:
+            return dict()
+    logger.info("Inspecting the files one by one")
+    units = dict()
+    for cljfile in files:
+        units.update(_inspect_files([cljfile], repo))
+    return units
+
+
 def _sexp_read(s):
     """Reads in a sexp describing a Clojure codebase
     and convert it into the common representation."""
@@ -180,7 +208,7 @@ def clojure_codebase_to_units(location):
     if "CLASSPATH" not in os.environ:
         logger.warning("No CLASSPATH set")
     else:
-        logger.info("CLASSPATH is:\n\t{}".format(os.environ["CLASSPATH"]))
+        logger.info("CLASSPATH is:\n\t%s", os.environ["CLASSPATH"])
 
     # Inspect .clj files
     cljfiles = []
@@ -190,17 +218,22 @@ def clojure_codebase_to_units(location):
                      for f in files
                      if f.endswith(_source_file_ext) and not config.file_ignored(f)]
 
+    # Every run of the inspector starts a JVM, so inspect as many files
+    # as possible at once, split between clojure/inspector_processes runs.
     units = dict()
-    for cljfile in cljfiles:
-        try:
-            inspector_out = _run_inspector(cljfile, location)
-            units.update(_sexp_read(inspector_out))
-        except _ClojureUtilityException:
-            logger.warn("File {} failed to parse".format(cljfile))
-            if not config.clojure_omit_on_error():
-                raise
+    if len(cljfiles) == 0:
+        return units
+    processes = max(1, min(config.clojure_inspector_processes(), len(cljfiles)))
+    shard_size = -(-len(cljfiles) // processes)  # Round up
+    shards = [cljfiles[i:i + shard_size] for i in range(0, len(cljfiles), shard_size)]
+    logger.info("Inspecting %d files in %d process(es)", len(cljfiles), len(shards))
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        for shard_units in executor.map(lambda shard: _inspect_files(shard, location), shards):
+            units.update(shard_units)
     return units
 
 
 build_required = False
+checkout_required = True
+incremental_supported = False
 codebase_to_units = clojure_codebase_to_units
@@ -20,6 +20,8 @@ Source control handling for Git.
 
 import os
 import tempfile
+import threading
+import subprocess
 
 from autobump import config
 from autobump.common import popen, VersionControlException
@@ -56,6 +58,146 @@ def git_get_commit(repo, commit):
     return temp_dir_handle, checkout_dir
 
 
+def git_resolve_commit(repo, revision):
+    """Return the full commit id a revision points to."""
+    return_code, stdout, _ = popen([config.git(), "rev-parse", "--verify", revision + "^{commit}"], cwd=repo)
+    if return_code != 0:
+        raise VersionControlException("Failed to resolve {} in Git repository {}"
+                                      .format(revision, repo))
+    return stdout
+
+
+def git_export_commit(repo, commit, export_dir):
+    """Write the files of a commit into a directory,
+    without any of the repository metadata.
+
+    The files are checked out exactly as 'git checkout' would,
+    through a temporary index so that the repository is left untouched."""
+    with tempfile.TemporaryDirectory() as index_dir:
+        env = dict(os.environ, GIT_INDEX_FILE=os.path.join(index_dir, "index"))
+        for args in [["read-tree", commit],
+                     ["checkout-index", "--all", "--prefix", os.path.join(os.path.abspath(export_dir), "")]]:
+            child = subprocess.run([config.git()] + args,
+                                   cwd=repo,
+                                   env=env,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+            if child.returncode != 0:
+                raise VersionControlException("Exporting commit {} of {} failed!\n{}"
+                                              .format(commit, repo, child.stderr.decode("utf-8", errors="replace")))
+
+
+class GitTree(object):
+    """Read-only view of a commit, served straight from the object store.
+
+    Files are listed with 'git ls-tree' and their contents are streamed
+    on demand through a single long-lived 'git cat-file --batch' process,
+    so no working tree is ever written to disk.
+
+    Language handlers walk it through 'common.walk' and 'common.read_source'."""
+
+    def __init__(self, repo, commit):
+        self.repo = repo
+        self.commit = commit
+        self.root = dict()
+        self.blobs = dict()
+        self._process = None
+        self._lock = threading.Lock()
+        self._list_files()
+
+    def _list_files(self):
+        child = subprocess.run([config.git(), "ls-tree", "-r", "-z", "--full-tree", self.commit],
+                               cwd=self.repo,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+        if child.returncode != 0:
+            raise VersionControlException("Listing files of commit {} in {} failed!"
+                                          .format(self.commit, self.repo))
+        for entry in child.stdout.decode("utf-8", errors="surrogateescape").split("\0"):
+            if entry == "":
+                continue
+            meta, path = entry.split("\t", 1)
+            mode, kind, blob = meta.split()
+            # Skip submodules and symbolic links, as there
+            # is no source code to be read from them.
+            if kind != "blob" or mode == "120000":
+                continue
+            components = path.split("/")
+            node = self.root
+            for component in components[:-1]:
+                node = node.setdefault(component, dict())
+            node[components[-1]] = blob
+            self.blobs[os.path.join(*components)] = blob
+
+    def walk(self):
+        """Yield (root, dirs, files) tuples like os.walk.
+
+        As with os.walk, 'dirs' can be modified in place
+        to prune the directories that are visited."""
+        stack = [("", self.root)]
+        while len(stack) > 0:
+            root, node = stack.pop()
+            dirs = sorted(n for n, child in node.items() if isinstance(child, dict))
+            files = sorted(n for n, child in node.items() if not isinstance(child, dict))
+            yield root, dirs, files
+            for d in reversed(dirs):
+                stack.append((os.path.join(root, d), node[d]))
+
+    def read(self, path):
+        """Return the contents of a file in the tree as bytes."""
+        blob = self.blobs[path]
+        with self._lock:
+            if self._process is None:
+                self._process = subprocess.Popen([config.git(), "cat-file", "--batch"],
+                                                 cwd=self.repo,
+                                                 stdin=subprocess.PIPE,
+                                                 stdout=subprocess.PIPE,
+                                                 stderr=subprocess.DEVNULL)
+            self._process.stdin.write(blob.encode("ascii") + b"\n")
+            self._process.stdin.flush()
+            header = self._process.stdout.readline().split()
+            if len(header) != 3:
+                raise VersionControlException("Reading {} from commit {} failed!"
+                                              .format(path, self.commit))
+            data = self._process.stdout.read(int(header[2]))
+            self._process.stdout.read(1)  # Trailing newline.
+        return data
+
+    def cleanup(self):
+        """Stop the 'git cat-file' process, if one was started."""
+        with self._lock:
+            if self._process is not None:
+                self._process.stdin.close()
+                self._process.wait()
+                self._process.stdout.close()
+                self._process = None
+
+
+def git_get_tree(repo, commit):
+    """Get a tree object giving access to the files of a commit
+    without checking it out.
+
+    The tree object is both the handle and the location:
+    the caller is responsible for calling cleanup() on it afterwards."""
+    tree = GitTree(os.path.abspath(repo), commit)
+    return tree, tree
+
+
+def git_changed_files(repo, a_commit, b_commit):
+    """Return a list of paths to files that differ between two commits.
+
+    Renamed files are reported under both their old and new path."""
+    child = subprocess.run([config.git(), "diff", "--name-only", "--no-renames", "-z", a_commit, b_commit],
+                           cwd=repo,
+                           stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE)
+    if child.returncode != 0:
+        raise VersionControlException("Failed to get changes between {} and {} in Git repository {}"
+                                      .format(a_commit, b_commit, repo))
+    paths = child.stdout.decode("utf-8", errors="surrogateescape").split("\0")
+    return [os.path.join(*p.split("/")) for p in paths if p != ""]
+
+
 def git_all_tags(repo):
     return_code, stdout, stderr = popen([config.git(), "tag", "--sort", "version:refname"], cwd=repo)
     if return_code != 0:
@@ -80,6 +222,10 @@ def git_last_commit(repo):
 
 
 get_commit = git_get_commit
+get_tree = git_get_tree
+resolve_commit = git_resolve_commit
+export_commit = git_export_commit
+changed_files = git_changed_files
 all_tags = git_all_tags
 last_tag = git_last_tag
 last_commit = git_last_commit
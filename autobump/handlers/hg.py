@@ -56,6 +56,35 @@ def hg_get_commit(repo, commit):
     return temp_dir_handle, checkout_dir
 
 
+def hg_resolve_commit(repo, revision):
+    """Return the full changeset id a revision points to."""
+    return_code, stdout, _ = popen([config.hg(), "log", "-r", revision, "--limit", "1", "--template", "{node}"], cwd=repo)
+    if return_code != 0:
+        raise VersionControlException("Failed to resolve {} in Hg repository {}"
+                                      .format(revision, repo))
+    return stdout
+
+
+def hg_export_commit(repo, commit, export_dir):
+    """Write the files of a changeset into a directory,
+    without any of the repository metadata."""
+    return_code, _, _ = popen([config.hg(), "archive", "--config", "ui.archivemeta=False",
+                               "-r", commit, "-t", "files", export_dir], cwd=repo)
+    if return_code != 0:
+        raise VersionControlException("Exporting changeset {} of {} failed!"
+                                      .format(commit, repo))
+
+
+def hg_changed_files(repo, a_commit, b_commit):
+    """Return a list of paths to files that differ between two changesets."""
+    return_code, stdout, _ = popen([config.hg(), "status", "-mar", "-n",
+                                    "--rev", a_commit, "--rev", b_commit], cwd=repo)
+    if return_code != 0:
+        raise VersionControlException("Failed to get changes between {} and {} in Hg repository {}"
+                                      .format(a_commit, b_commit, repo))
+    return [os.path.join(*p.split("/")) for p in stdout.splitlines() if p != ""]
+
+
 def hg_last_tag(repo):
     return_code, stdout, stderr = popen([config.hg(), "log", "-r", '"."', "--template", "{latesttag}"], cwd=repo)
     if return_code != 0:
@@ -81,6 +110,9 @@ def hg_last_commit(repo):
 
 
 get_commit = hg_get_commit
+resolve_commit = hg_resolve_commit
+export_commit = hg_export_commit
+changed_files = hg_changed_files
 all_tags = hg_all_tags
 last_tag = hg_last_tag
 last_commit = hg_last_commit
@@ -22,12 +22,15 @@ This handler does not require any external utilities. It uses the library
 """
 
 import os
-import copy
+import re
+import sys
+import bisect
 import logging
 import javalang
 
-from autobump import config
+from autobump import cache, config
 from autobump.capir import Type, Field, Parameter, Signature, Function, Unit
+from autobump.common import walk, read_source, parallel_map
 
 logger = logging.getLogger(__name__)
 
@@ -38,12 +41,84 @@ _builtin_types = {"T", "String", "Object", "Class", "List", "Set", "Map", "Throw
 _source_file_ext = ".java"
 
 
+class _SubtypeIndex(object):
+    """Answers whether one type is a subtype of another
+    without walking the type hierarchy.
+
+    Types are numbered in post-order of a depth-first traversal
+    of the hierarchy, and every type is labelled with the intervals
+    of numbers its subtypes have. With single inheritance that's a
+    single interval, interfaces may add a few more."""
+
+    def __init__(self, type_objects):
+        self.numbers = dict()
+        self.intervals = dict()
+        lowest = dict()
+        for root in type_objects.values():
+            if root.name in lowest:
+                continue
+            # Children are visited with an explicit stack,
+            # since hierarchies can be deeper than the recursion limit.
+            lowest[root.name] = len(self.numbers)
+            pending = [(root, iter(root.children))]
+            while len(pending) > 0:
+                node, children = pending[-1]
+                for child in children:
+                    if child.name not in lowest:
+                        lowest[child.name] = len(self.numbers)
+                        pending.append((child, iter(child.children)))
+                        break
+                else:
+                    pending.pop()
+                    number = len(self.numbers)
+                    self.numbers[node.name] = number
+                    intervals = [(lowest[node.name], number)]
+                    for child in node.children:
+                        # Children that weren't visited from this type
+                        # bring the intervals of their own subtypes.
+                        intervals.extend(zip(*self.intervals.get(child.name, ((), ()))))
+                    self.intervals[node.name] = _merge_intervals(intervals)
+
+    def is_subtype(self, name, supertype_name):
+        """Check whether type 'name' is (or is the same as) type 'supertype_name'."""
+        number = self.numbers.get(name, None)
+        if number is None or supertype_name not in self.intervals:
+            return False
+        starts, ends = self.intervals[supertype_name]
+        i = bisect.bisect_right(starts, number) - 1
+        return i >= 0 and number <= ends[i]
+
+
+def _merge_intervals(intervals):
+    """Merge a list of inclusive (start, end) intervals
+    into a tuple of (starts, ends) of disjoint intervals."""
+    starts = []
+    ends = []
+    for start, end in sorted(intervals):
+        if len(ends) > 0 and start <= ends[-1] + 1:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return tuple(starts), tuple(ends)
+
+
 class _JavaType(Type):
+    """A Java type, possibly an array of some dimension.
+
+    Array types share the set of children (direct subtypes)
+    and the subtype index of their element type."""
+    __slots__ = ("dimension", "children", "index")
 
-    def __init__(self, name, dimension=0):
-        self.name = name
+    def __init__(self, name, dimension=0, element_type=None):
+        self.name = sys.intern(name)
         self.dimension = dimension
-        self.children = set()
+        if element_type is None:
+            self.children = set()
+            self.index = None
+        else:
+            self.children = element_type.children
+            self.index = element_type.index
 
     def is_compatible(self, other):
         # Check if it's the same type
@@ -52,14 +127,8 @@ class _JavaType(Type):
         # Check if it's the same dimension.
         if self.dimension != other.dimension:
             return False
-        # Check if it's a direct descendant.
-        if len({jt for jt in self.children if jt.name == other.name}) == 1:
-            return True
-        # Recursively check all children.
-        for child in self.children:
-            if child.is_compatible(other):
-                return True
-        return False
+        # Check if it's a descendant.
+        return self.index is not None and self.index.is_subtype(other.name, self.name)
 
     def __eq__(self, other):
         return self.name == other.name and self.dimension == other.dimension
@@ -67,11 +136,15 @@ class _JavaType(Type):
     def __hash__(self):
         return hash((self.dimension, self.name))
 
+    def digest(self):
+        return (type(self), self.name, self.dimension)
+
     def __str__(self):
         return self.__repr__()
 
     def __repr__(self):
-        return "<JavaType {} {}, children: {}>".format(self.dimension, self.name, self.children)
+        # Only count the children, printing them would print the whole hierarchy below.
+        return "<JavaType {} {}, {} children>".format(self.dimension, self.name, len(self.children))
 
 
 class _JavaTypeSystem(object):
@@ -81,10 +154,16 @@ class _JavaTypeSystem(object):
     e.g. "java.util.List".
 
     When done, use 'finalize' to resolve all types and build Type
-    objects. Type objects can be looked up by using 'lookup'."""
+    objects. Type objects can be looked up by using 'lookup'.
+    There is a single Type object for every type (and array dimension),
+    shared by everything that refers to it."""
 
     def __init__(self):
         self.types = dict()
+        self.type_lookups = dict()
+        # Maps package names to the names (relative to the package)
+        # of all types declared in them.
+        self.package_types = dict()
         self.finalized = False
 
     def add_qualified_type(self, type_name, type_node_and_compilation):
@@ -92,6 +171,10 @@ class _JavaTypeSystem(object):
         assert type(type_node_and_compilation) is tuple
         # Add the type as it is
         self.types[type_name] = type_node_and_compilation
+        _, compilation = type_node_and_compilation
+        package = compilation.package.name if compilation.package is not None else ""
+        relative_name = type_name[len(package) + 1:] if package != "" else type_name
+        self.package_types.setdefault(package, set()).add(relative_name)
 
     def finalize(self):
         """Replace all Type AST nodes with Type objects."""
@@ -112,7 +195,7 @@ class _JavaTypeSystem(object):
                     assert not hasattr(node, "implements")
                     node.implements = node.extends
                 else:
-                    extends = _qualify_type(node.extends, compilation)
+                    extends = self.qualify(node.extends, compilation)
                     if extends in self.type_objects:
                         self.type_objects[extends].children.add(type_object)
                     else:
@@ -122,7 +205,7 @@ class _JavaTypeSystem(object):
 
             # Check 'implements' for this type
             if hasattr(node, "implements") and node.implements is not None:
-                implements = [_qualify_type(r, compilation) for r in node.implements]
+                implements = [self.qualify(r, compilation) for r in node.implements]
                 for interface in implements:
                     if interface in self.type_objects:
                         self.type_objects[interface].children.add(type_object)
@@ -136,6 +219,9 @@ class _JavaTypeSystem(object):
             type_object = _JavaType(primitive_type)
             self.type_objects[primitive_type] = type_object
 
+        index = _SubtypeIndex(self.type_objects)
+        for type_object in self.type_objects.values():
+            type_object.index = index
         self.types = self.type_objects
         self.finalized = True
 
@@ -146,30 +232,95 @@ class _JavaTypeSystem(object):
         if not self.finalized:
             self.finalize()
 
+        type_object = self.type_lookups.get(type_name, None)
+        if type_object is not None:
+            return type_object
+
         dimension = _array_dimension(type_name)
         type_wo_dimension = _strip_array_dimension(type_name)
         if type_wo_dimension not in self.types:
-            message = "{} is an external type".format(type_wo_dimension)
             if config.java_error_on_external_types():
-                logger.error(message)
+                logger.error("%s is an external type", type_wo_dimension)
                 exit(1)
             else:
-                logger.warning(message)
-                return _JavaType(type_name)
-
-        type_object = copy.deepcopy(self.types[type_wo_dimension])
-        type_object.dimension = dimension
+                logger.warning("%s is an external type", type_wo_dimension)
+                type_object = _JavaType(type_name)
+        elif dimension == 0:
+            type_object = self.types[type_wo_dimension]
+        else:
+            element_type = self.types[type_wo_dimension]
+            type_object = _JavaType(element_type.name, dimension, element_type)
+        self.type_lookups[type_name] = type_object
         return type_object
 
+    def qualify(self, type, compilation):
+        """Return the fully-qualified name of a type reference in a compilation unit."""
+        name = type.name
+        dimension = len(getattr(type, "dimensions", []))
+        if name in _primitive_types or name in _builtin_types:
+            return _prefix_array_dimension(name, dimension)
+        symbol_table = getattr(compilation, "symbol_table", None)
+        if symbol_table is None:
+            symbol_table = self._symbol_table(compilation)
+            compilation.symbol_table = symbol_table
+        qualified_name = symbol_table.get(name, "")
+        assert qualified_name is not None, \
+               "Don't know what to do: more than one candidate for qualifying {} found in {}".format(name, compilation.filename)
+        if qualified_name == "":
+            # Nothing matched - should be in this package.
+            assert name.find(".") == -1, \
+                   "Should never happen: no import statement found, yet {} is relative!".format(name)
+            if compilation.package is not None:
+                qualified_name = compilation.package.name + "." + name
+            else:
+                qualified_name = name
+            symbol_table[name] = qualified_name
+        return _prefix_array_dimension(qualified_name, dimension)
+
+    def _symbol_table(self, compilation):
+        """Map all names a compilation unit can refer to types by
+        to fully-qualified type names.
+
+        Names that are ambiguous are mapped to None."""
+        symbol_table = dict()
+        package = compilation.package.name if compilation.package is not None else ""
+        # Types from wildcard imports are shadowed by types of the same package,
+        # which are shadowed by types imported by name.
+        for i in [i for i in compilation.imports if i.wildcard and not i.static]:
+            for name in self.package_types.get(i.path, ()):
+                symbol_table.setdefault(name, i.path + "." + name)
+        for name in self.package_types.get(package, ()):
+            symbol_table[name] = package + "." + name if package != "" else name
+        imported = set()
+        for i in [i for i in compilation.imports if not i.wildcard]:
+            # An imported type may be referred to with any
+            # number of the enclosing packages or types.
+            parts = i.path.split(".")
+            for start in range(len(parts)):
+                name = ".".join(parts[start:])
+                if name in imported and symbol_table[name] != i.path:
+                    symbol_table[name] = None
+                else:
+                    symbol_table[name] = i.path
+                    imported.add(name)
+        return symbol_table
+
     def qualify_lookup(self, type, compilation):
         """Qualify and lookup a type name and get a Type object.
 
         Implicitly finalizes the JavaTypeSystem, if not done already."""
-        return self.lookup(_qualify_type(type, compilation))
+        return self.lookup(self.qualify(type, compilation))
+
 
+class _DummyType(_JavaType):
+    """Type that is compatible with everything."""
+    __slots__ = ()
+
+    def is_compatible(self, other):
+        return True
 
-_dummyType = _JavaType("dummy")
-_dummyType.is_compatible = lambda t: True
+
+_dummyType = _DummyType("dummy")
 
 
 def _array_dimension(name):
@@ -198,30 +349,6 @@ def _get_declarator_names(field):
     return [d.name for d in field.declarators]
 
 
-def _qualify_type(type, compilation):
-    """Return the fully-qualified name of a type reference in a compilation unit."""
-    name = type.name
-    dimension = len(getattr(type, "dimensions", []))
-    if name in _primitive_types or name in _builtin_types:
-        return _prefix_array_dimension(name, dimension)
-    candidates = [i for i in compilation.imports
-                  if i.path.endswith(name) and (i.path.find(name) == 0 or i.path[i.path.rfind(name) - 1] == ".")]
-    assert len(candidates) <= 1, \
-           "Don't know what to do: more than one candidate for qualifying {} found in {}".format(name, compilation.filename)
-    if len(candidates) == 1:
-        # Import statement exactly matched - must be this definition.
-        return _prefix_array_dimension(candidates[0].path, dimension)
-    else:
-        # No import statement matched - should be in this package.
-        # TODO: Handle wildcard imports somehow.
-        assert name.find(".") == -1, \
-               "Should never happen: no import statement found, yet {} is relative!".format(name)
-        if compilation.package is not None:
-            return _prefix_array_dimension(compilation.package.name + "." + name, dimension)
-        else:
-            return _prefix_array_dimension(name, dimension)
-
-
 def _get_parameters(method, type_system, compilation):
     """Return a list of Parameters to a method."""
     parameters = []
@@ -290,24 +417,117 @@ def _class_or_interface_to_unit(node, compilation, type_system):
              isinstance(n, javalang.tree.InterfaceDeclaration):
             units[n.name] = _class_or_interface_to_unit(n, compilation, type_system)
 
-    fqn = _qualify_type(node, compilation)
+    fqn = type_system.qualify(node, compilation)
     return Unit(fqn, fields, functions, units)
 
 
-def _source_to_compilation(filename, source):
-    """Convert source text from 'filename' into a compilation unit."""
+# Comments, string and character literals, and what's
+# significant to telling declarations from code outside of them.
+_declaration_tokens = re.compile(r"""//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|[{};]""", re.DOTALL)
+_type_declaration = re.compile(r"(?<![.\w])(class|interface|enum)(?!\w)")
+
+
+def _strip_code(source):
+    """Return the source text of a compilation unit with comments and
+    the contents of everything other than type bodies (method bodies,
+    initializer blocks, initializers of fields) removed.
+
+    What's left declares the same types and members, and is a lot
+    quicker to parse. Line breaks are kept, so that positions in
+    syntax errors stay the same."""
+    stripped = []
+    # Where the text not yet copied to 'stripped' starts.
+    position = 0
+    # Code (without comments and literals) since the last brace or semicolon.
+    statement = []
+    statement_end = 0
+    # Start of the block being removed, and how deeply nested in it we are.
+    skip_from = None
+    skip_depth = 0
+    for token in _declaration_tokens.finditer(source):
+        text = token.group()
+        if skip_from is not None:
+            if text == "{":
+                skip_depth += 1
+            elif text == "}":
+                skip_depth -= 1
+                if skip_depth == 0:
+                    stripped.append(source[position:skip_from])
+                    stripped.append("\n" * source.count("\n", skip_from, token.start()))
+                    position = token.start()
+                    skip_from = None
+                    statement = []
+                    statement_end = token.end()
+            continue
+        statement.append(source[statement_end:token.start()])
+        statement_end = token.end()
+        if text.startswith("//") or text.startswith("/*"):
+            stripped.append(source[position:token.start()])
+            stripped.append("\n" * text.count("\n"))
+            position = token.end()
+        elif text == "{":
+            if _type_declaration.search("".join(statement)) is None:
+                skip_from = token.end()
+                skip_depth = 1
+            statement = []
+        elif text in ("}", ";"):
+            statement = []
+    if skip_from is not None:
+        # Unbalanced braces, leave it to the parser to complain.
+        return source
+    stripped.append(source[position:])
+    return "".join(stripped)
+
+
+def _parse_compilation(source):
+    """Convert source text into a compilation unit.
+
+    Returns a pair of the compilation unit and None, or None and
+    the syntax error, so that errors can be reported by the caller
+    (possibly in another process)."""
     try:
-        tree = javalang.parse.parse(source)
+        if config.java_declarations_only():
+            source = _strip_code(source)
+        return javalang.parse.parse(source), None
     except javalang.parser.JavaSyntaxError as e:
-        logger.error("Java Syntax Error  {}:{}: {}"
-                    .format(filename, e.at, e.description))
-        logger.error("Stopped parsing {}".format(filename))
-        if not config.java_omit_on_error():
-            exit(1)
-        else:
-            tree = javalang.parse.parse("")
-    tree.filename = filename
-    return tree
+        return None, (str(e.at), e.description)
+
+
+def _sources_to_compilations(sources):
+    """Convert a list of (filename, source text) into compilation units.
+
+    Compilation units are looked up in the parse result cache first,
+    if it is enabled. The rest are parsed by config.parse_workers()
+    processes."""
+    trees = []
+    for _, source in sources:
+        key, tree = None, None
+        if cache.units_enabled():
+            key = cache.unit_key("java_ast", source, config.java_declarations_only())
+            tree = cache.load_unit(key)
+        trees.append((key, tree))
+
+    results = parallel_map(_parse_compilation,
+                           [source for (_, source), (_, tree) in zip(sources, trees) if tree is None],
+                           config.parse_workers(),
+                           config.parse_chunksize())
+    compilations = []
+    for (filename, _), (key, tree) in zip(sources, trees):
+        if tree is None:
+            tree, error = next(results)
+            if tree is None:
+                at, description = error
+                logger.error("Java Syntax Error  %s:%s: %s", filename, at, description)
+                logger.error("Stopped parsing %s", filename)
+                if not config.java_omit_on_error():
+                    exit(1)
+                else:
+                    tree = javalang.parse.parse("")
+            elif key is not None:
+                cache.store_unit(key, tree)
+        tree.filename = filename
+        compilations.append(tree)
+    return compilations
 
 
 def _compilation_to_unit(compilation, type_system):
@@ -361,19 +581,23 @@ def java_codebase_to_units(location):
     units = dict()
 
     # First pass
-    type_system = _JavaTypeSystem()
-    compilations = []
-    for root, dirs, files in os.walk(location):
+    sources = []
+    for root, dirs, files in walk(location):
         dirs[:] = [d for d in dirs if not config.dir_ignored(d)]
         javafiles = [f for f in files if f.endswith(_source_file_ext) and not config.file_ignored(f)]
         for javafile in javafiles:
-            with open(os.path.join(root, javafile), "r") as f:
-                compilation = _source_to_compilation(javafile, f.read())
-                for type_name, type_node in _compilation_get_types(compilation):
-                    type_system.add_qualified_type(type_name, (type_node, compilation))
-                compilations.append(compilation)
+            sources.append((javafile, read_source(location, os.path.join(root, javafile))))
+    # Only the parsing is done in parallel, compilation units are
+    # added to the type system in the same order as when done serially.
+    compilations = _sources_to_compilations(sources)
+    type_system = _JavaTypeSystem()
+    for compilation in compilations:
+        for type_name, type_node in _compilation_get_types(compilation):
+            type_system.add_qualified_type(type_name, (type_node, compilation))
 
     type_system.finalize()
+    if cache.units_enabled():
+        cache.evict_units()
 
     # Second pass
     for compilation in compilations:
@@ -384,4 +608,6 @@ def java_codebase_to_units(location):
 
 
 build_required = False
+checkout_required = False
+incremental_supported = False
 codebase_to_units = java_codebase_to_units
@@ -21,15 +21,18 @@ This handler needs too additional Java utilities (found under 'libexec/') that d
 on compiled Java code.
 """
 
+import io
 import os
 import sys
 import shutil
 import logging
 import tempfile
+import threading
 import subprocess
 from xml.etree import ElementTree
+from concurrent.futures import ThreadPoolExecutor
 
-from autobump import config
+from autobump import cache, config
 from autobump.capir import Type, Field, Parameter, Signature, Function, Unit
 from autobump.common import popen
 
@@ -44,8 +47,10 @@ class _JavaNativeType(Type):
     When checking for compatibility with another type,
     an external utility will be invoked to perform introspection
     and find out if Java considers two types to be compatible."""
+    __slots__ = ("dimension", "location")
+
     def __init__(self, name, dimension=0):
-        self.name = name
+        self.name = sys.intern(name)
         self.dimension = dimension
 
     def is_compatible(self, other):
@@ -60,8 +65,33 @@ class _JavaNativeType(Type):
         else:
             return _run_type_compatibility_checker(self.location, self.name, other.name)
 
+    @classmethod
+    def prefetch_compatibility(cls, pairs):
+        """Check all pairs that aren't known yet with as few
+        TypeCompatibilityChecker queries as possible."""
+        if not config.java_batch_type_checks():
+            return
+        queries = dict()
+        for a, b in pairs:
+            if not isinstance(a, cls) or type(a) is not type(b):
+                continue
+            if a.dimension != b.dimension or a.name == b.name:
+                continue
+            location = getattr(a, "location", None)
+            if location is None or _compatibility_memo.known(location, a.name, b.name):
+                continue
+            queries.setdefault(location, set()).add((a.name, b.name))
+        for location, location_queries in queries.items():
+            location_queries = sorted(location_queries)
+            logger.debug("Checking %d pairs of types in %s at once", len(location_queries), location)
+            results = _run_type_compatibility_checker_batch(location, location_queries)
+            for (superclass, subclass), result in zip(location_queries, results):
+                _compatibility_memo.add(location, superclass, subclass, result)
+
     def __eq__(self, other):
-        return self.is_compatible(other) and other.is_compatible(self)
+        # Types compatible with each other are the same type, so there's
+        # no need to ask the TypeCompatibilityChecker.
+        return type(self) is type(other) and self.name == other.name and self.dimension == other.dimension
 
     def __str__(self):
         return self.__repr__()
@@ -72,9 +102,19 @@ class _JavaNativeType(Type):
     def __hash__(self):
         return hash((self.dimension, self.name))
 
+    def digest(self):
+        return (type(self), self.name, self.dimension)
+
+
+class _DummyType(_JavaNativeType):
+    """Type that is compatible with everything."""
+    __slots__ = ()
+
+    def is_compatible(self, other):
+        return True
 
-_dummyType = _JavaNativeType("dummy")
-_dummyType.is_compatible = lambda t: True
+
+_dummyType = _DummyType("dummy")
 
 
 class JavaUtilityException(Exception):
@@ -82,49 +122,232 @@ class JavaUtilityException(Exception):
 
 
 def _run_inspector(location, classnames):
-    """Run the Inspector program to get the XML representation
-    of classes found in 'location'."""
-    return _run_utility("Inspector", [location] + classnames)
+    """Run the Inspector program on classes in 'location',
+    and yield a Unit for each of them.
+
+    The output of the Inspector (XML or tab-separated values,
+    depending on java_native/inspector_format) is parsed as it is read,
+    and every top-level class is converted and discarded as soon as
+    it is complete, so that the whole output is never kept in memory.
+
+    Class names are written to the standard input of the Inspector,
+    as there may be too many of them for a command line."""
+    if config.java_inspector_format() == "tsv":
+        args, stream_to_units = ["--tsv"], _tsv_stream_to_units
+    else:
+        args, stream_to_units = [], _xml_stream_to_units
+    # Collect stderr in a file, as nothing would read from a pipe.
+    with tempfile.TemporaryFile() as stderr:
+        child = subprocess.Popen([config.java(), "Inspector"] + args + [location],
+                                 cwd=_utility_basedir("Inspector"),
+                                 stdin=subprocess.PIPE,
+                                 stdout=subprocess.PIPE,
+                                 stderr=stderr)
+        # The Inspector reads all class names before it writes anything.
+        try:
+            child.stdin.write("".join(name + "\n" for name in classnames).encode("utf-8"))
+            child.stdin.close()
+        except BrokenPipeError:
+            # It failed early, which is reported below.
+            pass
+        try:
+            yield from stream_to_units(child.stdout)
+        except (ElementTree.ParseError, ValueError):
+            # Unless the Inspector failed, which is reported below.
+            if child.wait() == 0:
+                raise
+        finally:
+            child.stdout.close()
+            return_code = child.wait()
+        if return_code != 0:
+            stderr.seek(0)
+            raise JavaUtilityException(stderr.read().decode("utf-8", errors="replace").strip())
+
+
+class _CompatibilityMemo(object):
+    """Results of TypeCompatibilityChecker queries, which
+    can't change for a location during a run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def known(self, location, superclass, subclass):
+        return (location, superclass, subclass) in self.results
+
+    def get(self, location, superclass, subclass):
+        """Return the memoized result, or None if there isn't one."""
+        with self.lock:
+            result = self.results.get((location, superclass, subclass), None)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
 
+    def add(self, location, superclass, subclass, result):
+        with self.lock:
+            self.results[(location, superclass, subclass)] = result
 
-def _run_type_compatibility_checker(location, superclass, subclass):
-    """Run the TypeCompatibilityChecker program and return a boolean
-    indicating whether 'superclass' can really be substituted with 'subclass'."""
-    output = _run_utility("TypeCompatibilityChecker", [location, superclass, subclass])
-    return output == "true"
+    def clear(self):
+        with self.lock:
+            if self.hits + self.misses > 0:
+                logger.info("Type compatibility checks: %d memoized, %d run", self.hits, self.misses)
+            self.results.clear()
+            self.hits = 0
+            self.misses = 0
 
 
-def _compile_and_run_utility(utility, args):
-    """Compile a utility somewhere in a temporary directory
-    so it can be used this time, and then run it."""
+_compatibility_memo = _CompatibilityMemo()
+# Pairs of types sent to TypeCompatibilityChecker at a time. Keeps command
+# lines short, and pipes from filling up while queries are being written.
+_batch_size = 500
 
-    logger.warning("Compiling {} in place".format(utility))
-    filename = utility + ".java"
-    # First, try to compile in place.
-    return_code, stdout, stderr = popen([config.javac()] + [filename], cwd=libexec)
-    if return_code != 0:
-        logger.warning("Failed to compile {} in place, trying in a tempdir"
-                       .format(utility))
-        with tempfile.TemporaryDirectory() as dir:
-            shutil.copy(os.path.join(libexec, filename), dir)
-            return_code, stdout, stderr = popen([config.javac()] + [filename], cwd=dir)
-            if return_code != 0:
-                logger.error("Failed to compile {}! Please compile manually.".format(utility))
-                raise JavaUtilityException("{} needs to be compiled".format(utility))
-            # Call the utility from the temporary directory
-            return _run_utility(utility, args, basedir=dir)
-    # Compilation succeeded in-place, call the utility normally
-    return _run_utility(utility, args)
-
-
-def _run_utility(utility, args, basedir=libexec):
+
+def _run_type_compatibility_checker(location, superclass, subclass):
+    """Run the TypeCompatibilityChecker program and return a boolean
+    indicating whether 'superclass' can really be substituted with 'subclass'."""
+    result = _compatibility_memo.get(location, superclass, subclass)
+    if result is None:
+        result = _run_type_compatibility_checker_batch(location, [(superclass, subclass)])[0]
+        _compatibility_memo.add(location, superclass, subclass, result)
+    return result
+
+
+def _run_type_compatibility_checker_batch(location, pairs):
+    """Same as '_run_type_compatibility_checker', but for a list
+    of (superclass, subclass) pairs. Returns a list of booleans."""
+    results = []
+    for i in range(0, len(pairs), _batch_size):
+        batch = pairs[i:i + _batch_size]
+        if config.java_type_checker_server():
+            results += _type_checker_server(location).are_compatible(batch)
+        else:
+            args = [location] + [name for pair in batch for name in pair]
+            output = _run_utility("TypeCompatibilityChecker", args)
+            answers = output.split()
+            if len(answers) != len(batch):
+                raise JavaUtilityException("Expected {} answers from TypeCompatibilityChecker, got {}"
+                                           .format(len(batch), len(answers)))
+            results += [answer == "true" for answer in answers]
+    return results
+
+
+class _TypeCheckerServer(object):
+    """A TypeCompatibilityChecker that keeps running and answers
+    queries about the classes in one location, so that a JVM is not
+    started for every pair of types that needs to be checked."""
+
+    def __init__(self, location):
+        logger.debug("Starting TypeCompatibilityChecker for %s", location)
+        self.lock = threading.Lock()
+        # Collect stderr in a file, as nothing would read from a pipe.
+        self.stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen([config.java(), "TypeCompatibilityChecker", location],
+                                        cwd=_utility_basedir("TypeCompatibilityChecker"),
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        stderr=self.stderr,
+                                        universal_newlines=True)
+
+    def _error(self):
+        self.stderr.seek(0)
+        return JavaUtilityException(self.stderr.read().decode("utf-8", errors="replace").strip())
+
+    def are_compatible(self, pairs):
+        """Send all queries before reading any answers,
+        so that they take a single round trip."""
+        with self.lock:
+            try:
+                self.process.stdin.write("".join("{} {}\n".format(superclass, subclass)
+                                                 for superclass, subclass in pairs))
+                self.process.stdin.flush()
+                answers = [self.process.stdout.readline() for _ in pairs]
+            except BrokenPipeError:
+                answers = [""]
+            if "" in answers:
+                self.process.wait()
+                raise self._error()
+            return [answer.strip() == "true" for answer in answers]
+
+    def close(self):
+        with self.lock:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=10)
+            except (BrokenPipeError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+            self.process.stdout.close()
+            self.stderr.close()
+
+
+_type_checker_servers = dict()
+_type_checker_servers_lock = threading.Lock()
+
+
+def _type_checker_server(location):
+    """Return the running TypeCompatibilityChecker
+    for a location, starting it if necessary."""
+    with _type_checker_servers_lock:
+        server = _type_checker_servers.get(location, None)
+        if server is None:
+            server = _TypeCheckerServer(location)
+            _type_checker_servers[location] = server
+        return server
+
+
+def java_shutdown():
+    """Stop all utilities that were left running."""
+    _compatibility_memo.clear()
+    with _type_checker_servers_lock:
+        for server in _type_checker_servers.values():
+            server.close()
+        _type_checker_servers.clear()
+
+
+# Utilities compiled outside of 'libexec/', kept until the end of the run.
+_utility_dirs = dict()
+# Held while a utility is looked up and compiled, so that threads
+# don't compile it more than once, or use a half-written class file.
+_utility_dirs_lock = threading.Lock()
+
+
+def _utility_basedir(utility):
+    """Return the directory containing the compiled utility,
+    compiling it first if that has not been done."""
+    with _utility_dirs_lock:
+        javafile = os.path.join(libexec, utility + ".java")
+        classfile = os.path.join(libexec, utility + ".class")
+        if not os.path.isfile(javafile) or os.path.isfile(classfile):
+            return libexec
+        if utility in _utility_dirs:
+            return _utility_dirs[utility].name
+
+        logger.warning("%s has not been compiled", utility)
+        logger.warning("Compiling %s in place", utility)
+        filename = utility + ".java"
+        # First, try to compile in place.
+        return_code, stdout, stderr = popen([config.javac()] + [filename], cwd=libexec)
+        if return_code == 0:
+            return libexec
+        logger.warning("Failed to compile %s in place, trying in a tempdir", utility)
+        dir_handle = tempfile.TemporaryDirectory()
+        shutil.copy(javafile, dir_handle.name)
+        return_code, stdout, stderr = popen([config.javac()] + [filename], cwd=dir_handle.name)
+        if return_code != 0:
+            dir_handle.cleanup()
+            logger.error("Failed to compile %s! Please compile manually.", utility)
+            raise JavaUtilityException("{} needs to be compiled".format(utility))
+        _utility_dirs[utility] = dir_handle
+        return dir_handle.name
+
+
+def _run_utility(utility, args):
     """Run a Java utility program with arguments."""
-    javafile = os.path.join(basedir, utility + ".java")
-    classfile = os.path.join(basedir, utility + ".class")
-    if os.path.isfile(javafile) and not os.path.isfile(classfile):
-        logger.warning("{} has not been compiled".format(utility))
-        return _compile_and_run_utility(utility, args)
-    return_code, stdout, stderr = popen([config.java()] + [utility] + args, cwd=basedir)
+    return_code, stdout, stderr = popen([config.java()] + [utility] + args, cwd=_utility_basedir(utility))
     if return_code != 0:
         raise JavaUtilityException(stderr)
     return stdout
@@ -175,11 +398,68 @@ def _xml_element_to_unit(elt):
     return Unit(elt.attrib["name"], fields, functions, units)
 
 
+def _xml_stream_to_units(stream):
+    """Yield a Unit for every top-level <class> in an XML document read from 'stream'."""
+    root = None
+    depth = 0
+    for event, elt in ElementTree.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elt
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            # TODO: Validation of the XML shouldn't be done using assertions.
+            # Is validation even necessary in this case?
+            assert elt.tag == "class", "Found element in XML that's not <class>!"
+            yield _xml_element_to_unit(elt)
+            root.clear()
+
+
+def _tsv_stream_to_units(stream):
+    """Yield a Unit for every top-level class in the
+    tab-separated output of the Inspector read from 'stream'."""
+    # Classes that are not done yet, innermost last.
+    classes = []
+    for line in io.TextIOWrapper(stream, encoding="utf-8"):
+        record = line.rstrip("\n").split("\t")
+        kind = record[0]
+        try:
+            if kind == "method":
+                types = [_JavaNativeType(record[i], int(record[i + 1])) for i in range(2, len(record), 2)]
+                parameters = [Parameter("$AUTOBUMP_RETURN$", types[0])] + \
+                             [Parameter("arg{}".format(i), t) for i, t in enumerate(types[1:])]
+                functions = classes[-1].functions
+                if record[1] in functions:
+                    functions[record[1]].signatures.append(Signature(parameters))
+                else:
+                    functions[record[1]] = Function(record[1], _dummyType, [Signature(parameters)])
+            elif kind == "field":
+                classes[-1].fields[record[1]] = Field(record[1], _JavaNativeType(record[2], int(record[3])))
+            elif kind == "class":
+                classes.append(Unit(record[1], dict(), dict(), dict()))
+            elif kind == "end":
+                unit = classes.pop()
+                if len(classes) > 0:
+                    classes[-1].units[unit.name] = unit
+                else:
+                    yield unit
+            else:
+                raise ValueError
+        except (IndexError, ValueError):
+            raise ValueError("Unexpected line in Inspector output: {}".format(line.rstrip("\n")))
+    if len(classes) > 0:
+        raise ValueError("Inspector output ended inside of {}".format(classes[-1].name))
+
+
 def java_codebase_to_units(location, build_command, build_root):
     """Convert a Java codebase found at 'location' into a list of units.
 
     Works by compiling it with 'build_command' and then inspecting the
-    class files under 'location/build_root'."""
+    class files under 'location/build_root'. If the build output cache is
+    enabled, the class files are taken from there instead of compiling,
+    if the same source tree has been built with the same settings before."""
     # Compile the classes
     logger.info("Starting build process")
     if "CLASSPATH" in os.environ:
@@ -190,23 +470,30 @@ def java_codebase_to_units(location, build_command, build_root):
     if "CLASSPATH" not in os.environ:
         logger.warning("No CLASSPATH set")
     else:
-        logger.info("CLASSPATH is:\n\t{}".format(os.environ["CLASSPATH"]))
-
-    try:
-        subprocess.run(build_command,
-                       cwd=location,
-                       shell=True,
-                       check=True,
-                       stdout=sys.stderr,
-                       stderr=sys.stderr)
-    except subprocess.CalledProcessError:
-        logger.error("Failed to call {}".format(build_command))
-        exit(1)
-    logger.info("Build completed")
+        logger.info("CLASSPATH is:\n\t%s", os.environ["CLASSPATH"])
+
+    build_key = None
+    if cache.builds_enabled():
+        build_key = cache.build_key(location, build_command, build_root, os.environ.get("CLASSPATH", ""))
 
     # Get absolute path to build root
-    build_root = os.path.join(location, build_root)
-    logger.debug("Absolute build root is {}".format(build_root))
+    build_root = os.path.normpath(os.path.join(location, build_root))
+    logger.debug("Absolute build root is %s", build_root)
+
+    if build_key is None or not cache.load_build(build_key, build_root):
+        try:
+            subprocess.run(build_command,
+                           cwd=location,
+                           shell=True,
+                           check=True,
+                           stdout=sys.stderr,
+                           stderr=sys.stderr)
+        except subprocess.CalledProcessError:
+            logger.error("Failed to call %s", build_command)
+            exit(1)
+        logger.info("Build completed")
+        if build_key is not None:
+            cache.store_build(build_key, build_root)
 
     # Get a list of fully-qualified class names
     fqns = []
@@ -217,20 +504,26 @@ def java_codebase_to_units(location, build_command, build_root):
         if len(prefix) > 0 and prefix[0] == ".":
             prefix = prefix[1:]
         fqns = fqns + [((prefix + ".") if prefix != "" else "") + os.path.splitext(n)[0] for n in classfiles]
-    logger.debug("{} classes identified".format(len(fqns)))
+    logger.debug("%d classes identified", len(fqns))
 
-    # Convert the XML representation of these classes to Unit
-    xml = _run_inspector(build_root, fqns)
-    root = ElementTree.fromstring(xml)
+    # Convert the representation of these classes to Units,
+    # split between java_native/inspector_processes runs of the Inspector.
     units = dict()
-    for child in root:
-        # TODO: Validation of the XML shouldn't be done using assertions.
-        # Is validation even necessary in this case?
-        assert child.tag == "class", "Found element in XML that's not <class>!"
-        unit = _xml_element_to_unit(child)
-        units[unit.name] = unit
+    if len(fqns) == 0:
+        return units
+    processes = max(1, min(config.java_inspector_processes(), len(fqns)))
+    shard_size = -(-len(fqns) // processes)  # Round up
+    shards = [fqns[i:i + shard_size] for i in range(0, len(fqns), shard_size)]
+    logger.info("Inspecting %d classes in %d process(es)", len(fqns), len(shards))
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        for shard_units in executor.map(lambda shard: list(_run_inspector(build_root, shard)), shards):
+            for unit in shard_units:
+                units[unit.name] = unit
     return units
 
 
 build_required = True
+checkout_required = True
+incremental_supported = False
 codebase_to_units = java_codebase_to_units
+shutdown = java_shutdown
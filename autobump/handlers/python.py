@@ -21,12 +21,12 @@ Convert a Python codebase into a list of Units.
 import os
 import ast
 import sys
-import codecs
 import logging
 import traceback
 
-from autobump import config
+from autobump import cache, config
 from autobump.capir import Type, Field, Parameter, Signature, Function, Unit
+from autobump.common import walk, read_source, parallel_map
 
 logger = logging.getLogger(__name__)
 
@@ -34,10 +34,18 @@ _source_file_ext = ".py"
 
 
 class _PythonType(Type):
-    pass
+    __slots__ = ()
 
 
 class _Dynamic(_PythonType):
+    __slots__ = ()
+
+    def __init__(self):
+        # Give all instances the same name, so that they compare equal
+        # even when they were created in another process, e.g. Units
+        # loaded from the parse result cache.
+        self.name = "dynamic"
+
     def __str__(self):
         return self.__repr__()
 
@@ -46,6 +54,8 @@ class _Dynamic(_PythonType):
 
 
 class _StructuralType(_PythonType):
+    __slots__ = ("attr_set",)
+
     def __init__(self, attr_set):
         self.name = str(attr_set)
         self.attr_set = attr_set
@@ -60,8 +70,10 @@ class _StructuralType(_PythonType):
 
 
 class _HintedType(_PythonType):
+    __slots__ = ()
+
     def __init__(self, name):
-        self.name = name
+        self.name = sys.intern(name)
 
     def is_compatible(self, other):
         return self.__eq__(other)
@@ -79,66 +91,66 @@ class _HintedType(_PythonType):
 _dynamic = _Dynamic()
 
 
+class _TrueNone(object):
+    """Default value of parameters that default to None."""
+    pass
+
+
 def _is_public(member_name):
     """Determine visibility of a member based on its name."""
     return not (member_name.startswith("_") and member_name != "__init__")
 
 
-def _get_type_of_parameter(function, parameter):
-    """Return the type of a parameter used in a function AST node.
+def _get_types_of_parameters(function):
+    """Return a dictionary of the types of all parameters
+    of a function AST node, by parameter name.
 
     In this case, 'type' means structural instead of nominal type.
     Because Python is dynamically typed, it would be very hard to guess
     what type a parameter is without looking at usage. Instead of doing that,
     this walks the AST node describing the function and considers the type to be
-    the set of all methods called on the parameter."""
+    the set of all methods called on the parameter. A single walk
+    finds those of all parameters."""
     assert isinstance(function, ast.FunctionDef), "Tried to get usage of parameter in a non-function."
+    parameters = [arg.arg for arg in function.args.args]
+    types = dict()
 
-    # Check if there is a type hint for this parameter
+    # Check if there are type hints for the parameters
     if config.type_hinting():
         for arg in function.args.args:
-            if arg.arg == parameter:
-                if arg.annotation:
-                    return _HintedType(arg.annotation.id)
+            if arg.annotation:
+                types[arg.arg] = _HintedType(arg.annotation.id)
 
     if not config.structural_typing():
-        return _dynamic
+        for parameter in parameters:
+            types.setdefault(parameter, _dynamic)
+        return types
 
     # TODO: Don't completely ommit 'self' in class methods,
     # it can be used to identify addition or removal of fields.
-    if parameter == "self":
-        return _StructuralType(set())
-
-    # Generators to filter out AST
-    def gen_no_inner_definitions(node):
-        """Recursively yield all descendant nodes
-        without walking any function or class definitions."""
-        yield node
-        for n in ast.iter_child_nodes(node):
-            if isinstance(n, ast.FunctionDef) or \
-               isinstance(n, ast.ClassDef):
-                continue
-            yield from gen_no_inner_definitions(n)
-
-    def gen_only_attributes(node):
-        """Yield only descendant nodes that represent attribute access,
-        without traversing any function or class definitions."""
-        for n in gen_no_inner_definitions(node):
-            if isinstance(n, ast.Attribute) and \
-               isinstance(n.value, ast.Name):
-                yield n
-
-    # Find the set of attributes for that parameter
-    attr_set = set()
-    for attr in gen_only_attributes(function):
-        name = attr.value.id
-        method = attr.attr
-        if name == parameter:
-            # TODO: Also consider method signature.
-            attr_set.add(method)
-
-    # Convert set of attribytes to structural type
-    return _StructuralType(attr_set)
+    attr_sets = {parameter: set() for parameter in parameters
+                 if parameter not in types and parameter != "self"}
+
+    # Find the sets of attributes of the parameters by walking all
+    # descendant nodes, without walking any function or class definitions.
+    pending = [function]
+    while len(pending) > 0:
+        node = pending.pop()
+        if isinstance(node, ast.Attribute) and \
+           isinstance(node.value, ast.Name):
+            attr_set = attr_sets.get(node.value.id, None)
+            if attr_set is not None:
+                # TODO: Also consider method signature.
+                attr_set.add(node.attr)
+        # Reversed, so that nodes are visited in the order they appear.
+        pending.extend(reversed([n for n in ast.iter_child_nodes(node)
+                                 if not isinstance(n, (ast.FunctionDef, ast.ClassDef))]))
+
+    # Convert sets of attributes to structural types
+    for parameter in parameters:
+        if parameter not in types:
+            types[parameter] = _StructuralType(attr_sets.get(parameter, set()))
+    return types
 
 
 def _get_signature(function):
@@ -148,15 +160,14 @@ def _get_signature(function):
 
     # Map all None parameters to a "TrueNone" object
     # because None indicates the absense of a default value.
-    class TrueNone(object):
-        pass
-    defaults = [TrueNone
+    defaults = [_TrueNone
                 if isinstance(a, ast.NameConstant) and a.value is None
                 else a
                 for a in function.args.defaults]
     # Prepend no default values.
     defaults = [None] * (len(args) - len(defaults)) + defaults
 
+    types = _get_types_of_parameters(function)
     args_with_defaults = list(zip(args, defaults))
     for arg_with_default in args_with_defaults:
         arg, default = arg_with_default
@@ -170,8 +181,7 @@ def _get_signature(function):
             default = default.n
         elif isinstance(default, ast.Str):
             default = default.s
-        type = _get_type_of_parameter(function, arg.arg)
-        parameters.append(Parameter(arg.arg, type, default))
+        parameters.append(Parameter(arg.arg, types[arg.arg], default))
     # Note: we need to return a list with the signature inside
     # because the common representation allows for overloading,
     # which Python doesn't.
@@ -204,40 +214,89 @@ def _module_to_unit(name, module):
     return _container_to_unit(name, module)
 
 
+def _use_typed_ast():
+    """When the handler is invoked, the 'ast' module needs to start
+    pointing to 'ast35' from 'typed_ast' if type hinting is to be used.
+    Note that 'ast' must be changed globally, as the other functions in this
+    module rely on it as well."""
+    global ast
+    from typed_ast import ast35
+    ast = ast35
+
+
+def _parse_module(job):
+    """Convert the source of a module to a Unit.
+
+    Returns a pair of the Unit and None, or None and the traceback
+    if that failed, so that errors can be reported by the caller
+    (possibly in another process) in the same way as with serial parsing."""
+    pymodule, source = job
+    if config.type_hinting():
+        _use_typed_ast()
+    try:
+        return _module_to_unit(pymodule, ast.parse(source)), None
+    except Exception:
+        return None, traceback.format_exc()
+
+
+def _parse_failed(path, trace):
+    print(trace, file=sys.stderr)
+    if config.python_omit_on_error():
+        logger.warning("Failed to parse file %s", path)
+    else:
+        logger.error("Failed to parse file %s", path)
+        exit(1)
+
+
 def python_codebase_to_units(location):
     """Returns a list of Units representing a Python codebase in 'location'."""
     if config.type_hinting():
-        # When the handler is invoked, the 'ast' module needs to start
-        # pointing to 'ast35' from 'typed_ast' if type hinting is to be used.
-        # Note that 'ast' must be changed globally, as the other functions in this
-        # module rely on it as well.
-        global ast
-        from typed_ast import ast35
-        ast = ast35
+        _use_typed_ast()
 
+    use_cache = cache.units_enabled()
     units = dict()
-    for root, dirs, files in os.walk(location):
+    # Read everything up front (and look it up in the cache),
+    # so that only the parsing itself is handed out to workers.
+    modules = []
+    for root, dirs, files in walk(location):
         dirs[:] = [d for d in dirs if not config.dir_ignored(d)]
         pyfiles = [f for f in files if f.endswith(_source_file_ext) and not config.file_ignored(f)]
         for pyfile in pyfiles:
+            path = os.path.join(root, pyfile)
             pymodule = pyfile[:-(len(_source_file_ext))]  # Strip extension
-            with codecs.open(os.path.join(root, pyfile),
-                             "r",
-                             encoding="utf-8",
-                             errors="replace") as f:
-                try:
-                    units[pymodule] = _module_to_unit(pymodule, ast.parse(f.read()))
-                except Exception:
-                    print(traceback.format_exc(), file=sys.stderr)
-                    msg = "Failed to parse file {}".format(os.path.join(root, pyfile))
-                    if config.python_omit_on_error():
-                        logger.warning(msg)
-                    else:
-                        logger.error(msg)
-                        exit(1)
+            try:
+                source = read_source(location, path)
+            except Exception:
+                _parse_failed(path, traceback.format_exc())
+                continue
+            key, unit = None, None
+            if use_cache:
+                key = cache.unit_key("python", source, pymodule, config.structural_typing(), config.type_hinting())
+                unit = cache.load_unit(key)
+            modules.append((path, pymodule, source, key, unit))
+
+    results = parallel_map(_parse_module,
+                           [(pymodule, source) for _, pymodule, source, _, unit in modules if unit is None],
+                           config.parse_workers(),
+                           config.parse_chunksize())
+    # Results come back in the order of the walk,
+    # which keeps the output the same as with serial parsing.
+    for path, pymodule, _, key, unit in modules:
+        if unit is None:
+            unit, trace = next(results)
+            if unit is None:
+                _parse_failed(path, trace)
+                continue
+            if use_cache:
+                cache.store_unit(key, unit)
+        units[pymodule] = unit
 
+    if use_cache:
+        cache.evict_units()
     return units
 
 
 build_required = False
+checkout_required = False
+incremental_supported = True
 codebase_to_units = python_codebase_to_units
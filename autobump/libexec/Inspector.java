@@ -27,6 +27,14 @@ import java.util.Set;
 import java.util.HashSet;
 
 import java.io.File;
+import java.io.BufferedReader;
+import java.io.InputStreamReader;
+import java.io.IOException;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.BufferedOutputStream;
+import java.io.PrintStream;
+import java.io.UnsupportedEncodingException;
 
 import java.lang.reflect.Field;
 import java.lang.reflect.Method;
@@ -48,9 +56,12 @@ import org.w3c.dom.Element;
  * classes and serializes their definitions as XML, which is then printed
  * to stdout.
  *
- * Usage: java Inspector [build-location] [class-names...]
- *   where [build-location] is a path to a directory where the tree of Java classes resides.
+ * Usage: java Inspector [--tsv] [build-location] [class-names...]
+ *   where --tsv prints the definitions in a line-oriented format instead of XML,
+ *               see classToTSV.
+ *         [build-location] is a path to a directory where the tree of Java classes resides.
  *         [class-names...] is a list of one or more fully-qualified class names.
+ *                          If there are none, they are read from stdin, one per line.
  *
  * This program is invoked by autobump's Java handler to assist with converting
  * a Java codebase into its internal API representation.
@@ -165,29 +176,117 @@ public class Inspector {
         return doc;
     }
 
+    private static String typeToTSV(Class type) {
+        return typeBasename(type) + "\t" + typeDimension(type);
+    }
+
+    /**
+     * Print a Class as lines of tab-separated values:
+     *   class  [name]
+     *   field  [name] [type] [dimension]
+     *   method [name] [return type] [dimension] [parameter type] [dimension]...
+     *   ...inner classes, in the same format...
+     *   end
+     * Unlike with XML, every class is printed as soon as it is inspected.
+     */
+    private static void classToTSV(Class inspected, Set<String> visitedClasses, PrintStream out) {
+        if (visitedClasses.contains(inspected.getName())) {
+            return;
+        } else {
+            visitedClasses.add(inspected.getName());
+        }
+        out.print("class\t");
+        out.println(inspected.getName());
+
+        for (Field field : inspected.getFields()) {
+            out.print("field\t");
+            out.print(field.getName());
+            out.print("\t");
+            out.println(typeToTSV(field.getType()));
+        }
+
+        for (Method method : inspected.getMethods()) {
+            out.print("method\t");
+            out.print(method.getName());
+            out.print("\t");
+            out.print(typeToTSV(method.getReturnType()));
+            for (Class type : method.getParameterTypes()) {
+                out.print("\t");
+                out.print(typeToTSV(type));
+            }
+            out.println();
+        }
+
+        for (Class definition : inspected.getClasses()) {
+            classToTSV(definition, visitedClasses, out);
+        }
+        out.println("end");
+    }
+
     public static void main(String[] args) {
 
         // Validate and parse arguments
         Queue<Class> forInspection = new LinkedList<Class>();
-        if (args.length < 1) {
-            abort("Invalid number of arguments: expected [build-location] [class-names...]");
+        boolean tsv = args.length > 0 && args[0].equals("--tsv");
+        int first = tsv ? 1 : 0;
+        if (args.length < first + 1) {
+            abort("Invalid number of arguments: expected [--tsv] [build-location] [class-names...]");
         }
 
         ClassLoader loader = null;
         try {
-            loader = instantiateClassLoader(args[0]);
+            loader = instantiateClassLoader(args[first]);
         } catch(MalformedURLException ex) {
-            abort(String.format("%s is not a valid location", args[0]));
+            abort(String.format("%s is not a valid location", args[first]));
+        }
+
+        // Class names are read from stdin when there are too many for the command line.
+        // All of them are read before anything is printed, so that whoever
+        // writes them doesn't need to read stdout at the same time.
+        Queue<String> classNames = new LinkedList<String>();
+        for (int i = first + 1; i < args.length; i++) {
+            classNames.add(args[i]);
+        }
+        if (args.length == first + 1) {
+            try {
+                BufferedReader in = new BufferedReader(new InputStreamReader(System.in, "UTF-8"));
+                String line;
+                while ((line = in.readLine()) != null) {
+                    if (!line.isEmpty()) {
+                        classNames.add(line);
+                    }
+                }
+            } catch(IOException ex) {
+                abort("Failed to read class names from stdin");
+            }
         }
 
-        for (int i = 1; i < args.length; i++) {
+        for (String className : classNames) {
             try {
-                forInspection.add(loader.loadClass(args[i]));
+                forInspection.add(loader.loadClass(className));
             } catch(ClassNotFoundException ex) {
-                abort(String.format("Class %s not found", args[i]));
+                abort(String.format("Class %s not found", className));
             } catch(NoClassDefFoundError ex) {
-                abort(String.format("Class " + args[i] + " present at compile time, but not now. Is the build root correct?"));
+                abort(String.format("Class " + className + " present at compile time, but not now. Is the build root correct?"));
+            }
+        }
+
+        if (tsv) {
+            PrintStream out = null;
+            try {
+                out = new PrintStream(new BufferedOutputStream(new FileOutputStream(FileDescriptor.out), 1 << 16),
+                                      false, "UTF-8");
+            } catch(UnsupportedEncodingException ex) {
+                abort("UTF-8 is not supported");
+            }
+            while (!forInspection.isEmpty()) {
+                classToTSV(forInspection.remove(), new HashSet<String>(), out);
             }
+            out.flush();
+            if (out.checkError()) {
+                abort("Failed to write to stdout");
+            }
+            return;
         }
 
         // Prepare XML machinery
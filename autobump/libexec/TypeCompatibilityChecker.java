@@ -22,6 +22,9 @@ import java.net.URLClassLoader;
 import java.net.MalformedURLException;
 
 import java.io.File;
+import java.io.IOException;
+import java.io.BufferedReader;
+import java.io.InputStreamReader;
 
 /**
  *
@@ -31,11 +34,19 @@ import java.io.File;
  *
  *           A is compatible with B <=> A can be substituted by B
  *
- * Usage: java TypeCompatibilityChecker [build-location] [superclass] [subclass]
+ * Usage: java TypeCompatibilityChecker [build-location] [superclass] [subclass] ...
  *   where [build-location] is a path to a directory where the tree of Java classes resides.
  *         [superclass] is the fully-qualified name of type A.
  *         [subclass] is the fully-qualified name of type B.
  *
+ * More pairs of [superclass] [subclass] may follow, and "true" or "false"
+ * is printed on a separate line for each one of them.
+ *
+ * When only [build-location] is given, the program keeps running and answers
+ * many queries instead, so that the JVM and the ClassLoader are only set up once.
+ * Every line on standard input is a query "[superclass] [subclass]", and
+ * "true" or "false" is printed for each one. The program exits at end of input.
+ *
  * This program is invoked by autobump's Java handler to assist with
  * checking the compatibility of types, e.g. when the type of a parameter to a method
  * has changed, but autobump is not sure whether that's a breaking change.
@@ -77,33 +88,56 @@ public class TypeCompatibilityChecker {
         return loader;
     }
 
+    private static boolean isCompatible(String superclassName, String subclassName, ClassLoader loader) {
+        try {
+            Class superclass = findClass(superclassName, loader);
+            Class subclass = findClass(subclassName, loader);
+            return superclass.isAssignableFrom(subclass);
+        } catch(ClassNotFoundException ex) {
+            return false;
+        }
+    }
+
+    private static void serve(ClassLoader loader) throws IOException {
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in));
+        String line;
+        while ((line = in.readLine()) != null) {
+            String[] query = line.trim().split("\\s+");
+            if (query.length != 2) {
+                abort(String.format("Invalid query '%s': expected [superclass] [subclass]", line));
+            }
+            System.out.println(isCompatible(query[0], query[1], loader) ? "true" : "false");
+            System.out.flush();
+        }
+    }
+
     public static void main(String[] args) {
 
         // Validate and parse parameters
-        if (args.length < 3) {
-            abort("Invalid number of arguments: expected [build-location] [superclass] [subclass]");
+        if (args.length != 1 && (args.length < 3 || args.length % 2 == 0)) {
+            abort("Invalid number of arguments: expected [build-location] [superclass] [subclass] ...");
         }
 
         ClassLoader loader = null;
-        Class superclass = null;
-        Class subclass = null;
         try {
-            // Constructing the ClassLoader and the subclass should never fail.
+            // Constructing the ClassLoader should never fail.
             loader = instantiateClassLoader(args[0]);
-            superclass = findClass(args[1], loader);
-            subclass = findClass(args[2], loader);
         } catch(MalformedURLException ex) {
             abort(String.format("%s is not a valid location", args[0]));
-        } catch(ClassNotFoundException ex) {
-            System.out.println("false");
-            System.exit(0);
+        }
+
+        if (args.length == 1) {
+            try {
+                serve(loader);
+            } catch(IOException ex) {
+                abort("Failed to read queries: " + ex.getMessage());
+            }
+            return;
         }
 
         // Check type compatibility
-        if (superclass.isAssignableFrom(subclass)) {
-            System.out.println("true");
-        } else {
-            System.out.println("false");
+        for (int i = 1; i < args.length; i += 2) {
+            System.out.println(isCompatible(args[i], args[i + 1], loader) ? "true" : "false");
         }
     }
 
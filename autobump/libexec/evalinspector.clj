@@ -261,9 +261,8 @@
 
 (defn main
   [args]
-  (when (or (empty? args)
-            (> (count args) 2))
-    (abort! "Invalid number of arguments: expected [file]"))
+  (when (empty? args)
+    (abort! "Invalid number of arguments: expected [files...]"))
   (-> args
       (describe-files)
       (println)))
@@ -0,0 +1,127 @@
+"""Measure how much memory CAPIR entities take up.
+
+Builds the same synthetic codebase twice, once out of CAPIR entities and
+once out of plain classes laid out like the entities used to be (attributes
+in a '__dict__', names not interned), and prints the memory used by each.
+
+Usage: python benchmarks/capir_memory.py [units] [functions per unit]
+"""
+
+import sys
+import tracemalloc
+
+from autobump.capir import Type, Field, Parameter, Signature, Function, Unit
+
+
+class _SlotType(Type):
+    __slots__ = ("dimension",)
+
+    def __init__(self, name, dimension=0):
+        self.name = sys.intern(name)
+        self.dimension = dimension
+
+
+# Layout of the entities before they had '__slots__'.
+class _DictEntity(object):
+    pass
+
+
+class _DictType(_DictEntity):
+    def __init__(self, name, dimension=0):
+        self.name = name
+        self.dimension = dimension
+
+
+class _DictField(_DictEntity):
+    def __init__(self, name, type):
+        self.name = name
+        self.type = type
+
+
+class _DictParameter(_DictEntity):
+    def __init__(self, name, type, default_value=None):
+        self.name = name
+        self.type = type
+        self.default_value = default_value
+
+
+class _DictSignature(_DictEntity):
+    def __init__(self, parameters):
+        self.parameters = parameters
+
+
+class _DictFunction(_DictEntity):
+    def __init__(self, name, type, signatures):
+        self.name = name
+        self.type = type
+        self.signatures = signatures
+
+
+class _DictUnit(_DictEntity):
+    def __init__(self, name, fields, functions, units):
+        self.name = name
+        self.fields = fields
+        self.functions = functions
+        self.units = units
+
+
+def _fresh(string):
+    """Return a copy of a string that is a new object,
+    like names read from source files are."""
+    return "".join(list(string))
+
+
+def _build(classes, n_units, n_functions):
+    """Build a codebase in the shape a Java handler produces:
+    overloaded methods whose parameters are of a few common types."""
+    type_, field, parameter, signature, function, unit = classes
+    type_names = ["java.lang.String", "java.lang.Object", "int", "java.util.List", "long"]
+    units = dict()
+    for u in range(n_units):
+        fields = dict()
+        functions = dict()
+        for f in range(n_functions // 4):
+            name = _fresh("field{}".format(f))
+            fields[name] = field(name, type_(_fresh(type_names[f % len(type_names)])))
+        for f in range(n_functions):
+            name = _fresh("method{}".format(f))
+            signatures = []
+            for s in range(2):
+                parameters = [parameter(_fresh("$AUTOBUMP_RETURN$"), type_(_fresh("void")))]
+                for p in range(3 + s):
+                    parameters.append(parameter(_fresh("arg{}".format(p)),
+                                                type_(_fresh(type_names[(f + p) % len(type_names)]))))
+                signatures.append(signature(parameters))
+            functions[name] = function(name, type_(_fresh("dummy")), signatures)
+        name = _fresh("package.Class{}".format(u))
+        units[name] = unit(name, fields, functions, dict())
+    return units
+
+
+def _measure(classes, n_units, n_functions):
+    tracemalloc.start()
+    codebase = _build(classes, n_units, n_functions)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del codebase
+    return current
+
+
+def main(argv):
+    n_units = int(argv[1]) if len(argv) > 1 else 2000
+    n_functions = int(argv[2]) if len(argv) > 2 else 20
+    entities = n_units * (1 + n_functions // 4 * 2 + n_functions * (2 + (1 + 4 * 2) + (1 + 5 * 2)))
+    print("Codebase of {} units with {} functions each, about {} entities".format(n_units, n_functions, entities))
+
+    dict_size = _measure((_DictType, _DictField, _DictParameter, _DictSignature, _DictFunction, _DictUnit),
+                         n_units, n_functions)
+    slot_size = _measure((_SlotType, Field, Parameter, Signature, Function, Unit),
+                         n_units, n_functions)
+    megabyte = 1024 * 1024
+    print("{:<28}{:>10.1f} MB".format("__dict__ entities", dict_size / megabyte))
+    print("{:<28}{:>10.1f} MB".format("CAPIR (slots, interned)", slot_size / megabyte))
+    print("{:<28}{:>10.1f} %".format("Reduction", 100.0 * (dict_size - slot_size) / dict_size))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
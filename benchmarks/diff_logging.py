@@ -0,0 +1,68 @@
+"""Measure what debug logging costs when comparing codebases
+with debug logging disabled.
+
+Compares two versions of a synthetic codebase in which every function
+changed, and counts how often types were turned into strings for log
+messages that were never emitted.
+
+Usage: python benchmarks/diff_logging.py [units] [functions per unit]
+"""
+
+import gc
+import sys
+import time
+import logging
+
+from autobump import diff
+from autobump.capir import Type, Field, Parameter, Signature, Function, Unit
+
+_formatted = 0
+
+
+class _CountingType(Type):
+    __slots__ = ()
+
+    def __init__(self, name):
+        self.name = sys.intern(name)
+
+    def __str__(self):
+        global _formatted
+        _formatted += 1
+        return self.name
+
+
+def _build(n_units, n_functions, version):
+    type_names = ["String", "Object", "int", "List", "long"]
+    units = dict()
+    for u in range(n_units):
+        fields = {"field{}".format(f): Field("field{}".format(f), _CountingType(type_names[(f + version) % 5]))
+                  for f in range(n_functions // 4)}
+        functions = dict()
+        for f in range(n_functions):
+            name = "method{}".format(f)
+            signatures = [Signature([Parameter("arg{}".format(p), _CountingType(type_names[(f + p + version) % 5]))
+                                     for p in range(3 + s)])
+                          for s in range(1 + f % 2)]
+            functions[name] = Function(name, _CountingType("void"), signatures)
+        name = "Class{}".format(u)
+        units[name] = Unit(name, fields, functions, dict())
+    return units
+
+
+def main(argv):
+    n_units = int(argv[1]) if len(argv) > 1 else 2000
+    n_functions = int(argv[2]) if len(argv) > 2 else 20
+    logging.getLogger("autobump.diff").setLevel(logging.INFO)
+    print("Codebase of {} units with {} functions each, all changed".format(n_units, n_functions))
+    a_units = _build(n_units, n_functions, 0)
+    b_units = _build(n_units, n_functions, 1)
+    gc.collect()
+    start = time.perf_counter()
+    bump = diff.compare_codebases(a_units, b_units, None)
+    elapsed = time.perf_counter() - start
+    print("{:<28}{:>10.3f} s ({})".format("Comparing", elapsed, bump))
+    print("{:<28}{:>10}".format("Types formatted", _formatted))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
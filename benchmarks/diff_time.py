@@ -0,0 +1,59 @@
+"""Measure how long comparing two versions of a codebase takes.
+
+Builds a synthetic codebase twice and compares the copies after changing
+a number of its units, so the time can be seen to follow the size of the
+change rather than the size of the codebase.
+
+Usage: python benchmarks/diff_time.py [units] [functions per unit]
+"""
+
+import gc
+import sys
+import time
+
+from autobump import diff
+from autobump.capir import Type, Field, Parameter, Signature, Function, Unit
+
+
+class _NamedType(Type):
+    __slots__ = ()
+
+    def __init__(self, name):
+        self.name = sys.intern(name)
+
+
+def _build(n_units, n_functions, changed_units):
+    type_names = ["String", "Object", "int", "List", "long"]
+    units = dict()
+    for u in range(n_units):
+        fields = {"field{}".format(f): Field("field{}".format(f), _NamedType(type_names[f % len(type_names)]))
+                  for f in range(n_functions // 4)}
+        functions = dict()
+        for f in range(n_functions):
+            name = "method{}".format(f)
+            parameters = [Parameter("arg{}".format(p), _NamedType(type_names[(f + p) % len(type_names)]))
+                          for p in range(3)]
+            if u < changed_units and f == 0:
+                parameters.append(Parameter("added", _NamedType("int"), True))
+            functions[name] = Function(name, _NamedType("void"), [Signature(parameters)])
+        name = "Class{}".format(u)
+        units[name] = Unit(name, fields, functions, dict())
+    return units
+
+
+def main(argv):
+    n_units = int(argv[1]) if len(argv) > 1 else 5000
+    n_functions = int(argv[2]) if len(argv) > 2 else 20
+    print("Codebase of {} units with {} functions each".format(n_units, n_functions))
+    a_units = _build(n_units, n_functions, 0)
+    for changed_units in [0, 1, n_units // 100, n_units // 10, n_units]:
+        b_units = _build(n_units, n_functions, changed_units)
+        gc.collect()
+        start = time.perf_counter()
+        bump = diff.compare_codebases(a_units, b_units, None)
+        elapsed = time.perf_counter() - start
+        print("{:>6} units changed: {:>8.3f} s ({})".format(changed_units, elapsed, bump))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,64 @@
+"""Measure evaluation mode with different numbers of workers.
+
+Evaluates a history of tags whose revisions take a while to read, like
+checking out and building them does, with one worker and with more.
+
+Usage: python benchmarks/evaluate_workers.py [tags] [seconds per revision] [workers]
+"""
+
+import io
+import sys
+import time
+import argparse
+import contextlib
+
+from autobump import evaluate
+from autobump.capir import Type, Field
+from autobump.config import config_overrides
+
+_type = Type()
+
+
+class _Handle(object):
+    def cleanup(self):
+        pass
+
+
+class _SlowHandler(object):
+    """Language handler that waits before returning the Units of a revision,
+    which have one more field in every revision."""
+    build_required = False
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def codebase_to_units(self, location):
+        time.sleep(self.delay)
+        minor = int(location.split(".")[1])
+        return {"field{}".format(f): Field("field{}".format(f), _type) for f in range(minor + 1)}
+
+
+def _evaluate(tags, delay, workers):
+    args = argparse.Namespace(f=tags[0], to=tags[-1], changelog=None, changelog_stdout=None,
+                              from_version=None, build_command=None, build_root=None, handler="slow")
+    handlers = (None, None, _SlowHandler(delay), lambda revision: (_Handle(), revision))
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), \
+            config_overrides({"run": {"evaluate_workers": workers}}):
+        failed = evaluate(args, tags, handlers)
+    return time.perf_counter() - start, failed
+
+
+def main(argv):
+    n_tags = int(argv[1]) if len(argv) > 1 else 40
+    delay = float(argv[2]) if len(argv) > 2 else 0.05
+    workers = int(argv[3]) if len(argv) > 3 else 4
+    tags = ["1.{}.0".format(minor) for minor in range(n_tags)]
+    print("{} tags, {:.2f} s to read each".format(n_tags, delay))
+    for n in [1, workers]:
+        elapsed, failed = _evaluate(tags, delay, n)
+        print("{:<28}{:>10.3f} s ({} mismatches)".format("{} worker(s)".format(n), elapsed, failed))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
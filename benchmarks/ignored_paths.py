@@ -0,0 +1,56 @@
+"""Measure checking whether entities are ignored.
+
+Checks a number of entity paths against a list of ignored entities, the
+way the configuration did before matchers were compiled (looking up and
+splitting the option, then searching the list, for every path) and
+through config.entity_ignored.
+
+Usage: python benchmarks/ignored_paths.py [paths] [ignored entities]
+"""
+
+import sys
+import time
+
+from autobump import config
+from autobump.config import config_overrides
+
+
+def _ignored_uncompiled(what, name):
+    """Check whether something should be ignored,
+    as done before matchers were compiled."""
+    only_consider_lit = config.get("only_consider", what)
+    ignored_lit = config.get("ignore", what)
+    if isinstance(only_consider_lit, str):
+        only_consider_lit = only_consider_lit.splitlines()
+    if isinstance(ignored_lit, str):
+        ignored_lit = ignored_lit.splitlines()
+    if len(only_consider_lit) > 0:
+        return name not in only_consider_lit
+    return name in ignored_lit
+
+
+def _time(check, paths):
+    start = time.perf_counter()
+    ignored = sum(1 for path in paths if check(path))
+    return time.perf_counter() - start, ignored
+
+
+def main(argv):
+    n_paths = int(argv[1]) if len(argv) > 1 else 100000
+    n_ignored = int(argv[2]) if len(argv) > 2 else 200
+    paths = ["package{}.Class{}.method{}".format(i % 50, i % 1000, i) for i in range(n_paths)]
+    ignored = "\n".join(paths[i] for i in range(0, n_paths, max(1, n_paths // n_ignored)))
+    print("{} entity paths, {} of them ignored".format(n_paths, n_ignored))
+    with config_overrides({"ignore": {"entities": ignored}}):
+        for name, check in [("Uncompiled", lambda path: _ignored_uncompiled("entities", path)),
+                            ("Compiled", config.entity_ignored)]:
+            elapsed, count = _time(check, paths)
+            print("{:<28}{:>10.3f} s ({} ignored)".format(name, elapsed, count))
+    patterns = "glob:package1.*\nre:package2\\.Class\\d+\\.method1\\d*"
+    with config_overrides({"ignore": {"entities": patterns}}):
+        elapsed, count = _time(config.entity_ignored, paths)
+        print("{:<28}{:>10.3f} s ({} ignored)".format("Compiled, with patterns", elapsed, count))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
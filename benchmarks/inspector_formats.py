@@ -0,0 +1,75 @@
+"""Compare the output formats of the Java Inspector.
+
+Generates what the Inspector would print for a number of classes in
+both formats, and times converting each into Units. If given a location
+with compiled classes (e.g. an unpacked jar), also times running the
+Inspector on all of them in both formats, which needs Java.
+
+Usage: python benchmarks/inspector_formats.py [classes] [location]
+"""
+
+import io
+import sys
+import time
+
+from autobump.config import config_overrides
+from autobump.handlers import java_native
+
+_methods = 30
+
+
+def _xml(n_classes):
+    xml = ['<?xml version="1.0" encoding="UTF-8" standalone="no"?><introspection>']
+    for c in range(n_classes):
+        xml.append('<class name="bench.Class{}">'.format(c))
+        xml.append('<field name="field"><type dimension="0" name="int"/></field>')
+        for m in range(_methods):
+            xml.append('<method name="method{}"><type dimension="0" name="java.lang.String"/><signature>'.format(m))
+            for p in range(3):
+                xml.append('<parameter name="arg{}"><type dimension="{}" name="java.util.List"/></parameter>'
+                           .format(p, p % 2))
+            xml.append('</signature></method>')
+        xml.append('</class>')
+    xml.append('</introspection>\n')
+    return "".join(xml).encode("utf-8")
+
+
+def _tsv(n_classes):
+    tsv = []
+    for c in range(n_classes):
+        tsv.append("class\tbench.Class{}\n".format(c))
+        tsv.append("field\tfield\tint\t0\n")
+        for m in range(_methods):
+            tsv.append("method\tmethod{}\tjava.lang.String\t0".format(m))
+            for p in range(3):
+                tsv.append("\tjava.util.List\t{}".format(p % 2))
+            tsv.append("\n")
+        tsv.append("end\n")
+    return "".join(tsv).encode("utf-8")
+
+
+def _time(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def _run_inspector(location, format):
+    with config_overrides({"java_native": {"inspector_format": format}}):
+        java_native.java_codebase_to_units(location, "true", ".")
+
+
+def main(argv):
+    n_classes = int(argv[1]) if len(argv) > 1 else 5000
+    print("{} classes with {} methods each".format(n_classes, _methods))
+    for format, output, stream_to_units in [("xml", _xml(n_classes), java_native._xml_stream_to_units),
+                                            ("tsv", _tsv(n_classes), java_native._tsv_stream_to_units)]:
+        elapsed = _time(lambda: list(stream_to_units(io.BytesIO(output))))
+        print("{:<28}{:>10.3f} s ({:.1f} MB)".format("Reading " + format, elapsed, len(output) / (1024 * 1024)))
+    if len(argv) > 2:
+        for format in ["xml", "tsv"]:
+            print("{:<28}{:>10.3f} s".format("Inspecting with " + format, _time(_run_inspector, argv[2], format)))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,60 @@
+"""Measure how quickly the java_ast handler parses Java files.
+
+Generates classes whose methods have bodies of a few statements, and
+parses them with javalang as they are, and with only their declarations
+(java_ast/declarations_only).
+
+Usage: python benchmarks/java_parse.py [files] [methods per class]
+"""
+
+import sys
+import time
+
+import javalang
+
+from autobump.handlers import java_ast
+
+_method = """
+    /** Does something {{ with }} {0}. */
+    public int method{0}(java.util.List<String> items, int count) {{
+        int total = 0;
+        for (String item : items) {{
+            if (item.length() > count && item.charAt(0) != '{{') {{
+                total += item.length() * {0};
+            }} else {{
+                total -= "}}".length();
+            }}
+        }}
+        return total;
+    }}
+"""
+
+
+def _source(i, n_methods):
+    methods = "".join(_method.format(m) for m in range(n_methods))
+    return "package bench;\nimport java.util.*;\n\npublic class Class{} {{\n{}}}\n".format(i, methods)
+
+
+def _parse_all(sources, declarations_only):
+    start = time.perf_counter()
+    for source in sources:
+        if declarations_only:
+            source = java_ast._strip_code(source)
+        javalang.parse.parse(source)
+    return time.perf_counter() - start
+
+
+def main(argv):
+    n_files = int(argv[1]) if len(argv) > 1 else 50
+    n_methods = int(argv[2]) if len(argv) > 2 else 30
+    sources = [_source(i, n_methods) for i in range(n_files)]
+    print("{} files with {} methods each".format(n_files, n_methods))
+    full = _parse_all(sources, False)
+    declarations = _parse_all(sources, True)
+    print("{:<28}{:>10.3f} s".format("Full parse", full))
+    print("{:<28}{:>10.3f} s".format("Declarations only", declarations))
+    print("{:<28}{:>10.1f} x".format("Speedup", full / declarations))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
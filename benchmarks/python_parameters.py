@@ -0,0 +1,65 @@
+"""Measure finding the structural types of parameters of Python functions.
+
+Generates functions with many parameters and large bodies, and compares
+walking each function once for all of its parameters to walking it once
+per parameter, like the python handler used to.
+
+Usage: python benchmarks/python_parameters.py [functions] [parameters] [statements]
+"""
+
+import ast
+import sys
+import time
+
+from autobump.config import config_overrides
+from autobump.handlers import python
+
+
+def _walk_per_parameter(function, parameter):
+    """Attributes of a parameter as found before all
+    parameters were handled with a single walk."""
+    def gen_no_inner_definitions(node):
+        yield node
+        for n in ast.iter_child_nodes(node):
+            if isinstance(n, ast.FunctionDef) or \
+               isinstance(n, ast.ClassDef):
+                continue
+            yield from gen_no_inner_definitions(n)
+
+    attr_set = set()
+    for n in gen_no_inner_definitions(function):
+        if isinstance(n, ast.Attribute) and isinstance(n.value, ast.Name) and n.value.id == parameter:
+            attr_set.add(n.attr)
+    return attr_set
+
+
+def _source(n_functions, n_parameters, n_statements):
+    parameters = ", ".join("p{}".format(p) for p in range(n_parameters))
+    body = "".join("    x = p{0}.method{1}(p{2}.attribute, [y.z for y in p{0}.items])\n"
+                   .format(s % n_parameters, s % 7, (s * 3) % n_parameters)
+                   for s in range(n_statements))
+    return "".join("def f{}({}):\n{}".format(f, parameters, body) for f in range(n_functions))
+
+
+def main(argv):
+    n_functions = int(argv[1]) if len(argv) > 1 else 20
+    n_parameters = int(argv[2]) if len(argv) > 2 else 20
+    n_statements = int(argv[3]) if len(argv) > 3 else 200
+    functions = ast.parse(_source(n_functions, n_parameters, n_statements)).body
+    print("{} functions with {} parameters and {} statements each".format(n_functions, n_parameters, n_statements))
+
+    start = time.perf_counter()
+    per_parameter = [{arg.arg: _walk_per_parameter(f, arg.arg) for arg in f.args.args} for f in functions]
+    per_parameter_time = time.perf_counter() - start
+    with config_overrides({"python": {"type_hinting": False, "structural_typing": True}}):
+        start = time.perf_counter()
+        single = [python._get_types_of_parameters(f) for f in functions]
+        single_time = time.perf_counter() - start
+    assert per_parameter == [{p: t.attr_set for p, t in types.items()} for types in single]
+    print("{:<28}{:>10.3f} s".format("Walk per parameter", per_parameter_time))
+    print("{:<28}{:>10.3f} s".format("Single walk", single_time))
+    print("{:<28}{:>10.1f} x".format("Speedup", per_parameter_time / single_time))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
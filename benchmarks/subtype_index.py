@@ -0,0 +1,83 @@
+"""Measure compatibility checks between Java types.
+
+Builds a synthetic hierarchy of classes that also implement interfaces,
+indexes it the way the java_ast handler does, and compares checking
+compatibility through the index to walking the hierarchy like the
+handler used to.
+
+Usage: python benchmarks/subtype_index.py [types] [checks]
+"""
+
+import sys
+import time
+import random
+
+from autobump.handlers import java_ast
+
+
+def _walk_compatible(supertype, subtype):
+    """Compatibility check as done before types were indexed."""
+    if supertype == subtype:
+        return True
+    if len({t for t in supertype.children if t.name == subtype.name}) == 1:
+        return True
+    for child in supertype.children:
+        if _walk_compatible(child, subtype):
+            return True
+    return False
+
+
+def _build(n_types):
+    """Build a hierarchy of 'n_types' classes and an interface for every
+    100 of them, where classes implement up to two interfaces."""
+    rng = random.Random(0)
+    types = {"Object": java_ast._JavaType("Object")}
+    interfaces = []
+    for i in range(n_types // 100):
+        interface = java_ast._JavaType("Interface{}".format(i))
+        if len(interfaces) > 0 and rng.random() < 0.5:
+            rng.choice(interfaces).children.add(interface)
+        interfaces.append(interface)
+        types[interface.name] = interface
+    classes = [types["Object"]]
+    for i in range(n_types):
+        cls = java_ast._JavaType("Class{}".format(i))
+        # Favour recent classes as superclasses, for deeper hierarchies.
+        rng.choice(classes[-200:] if rng.random() < 0.9 else classes).children.add(cls)
+        for interface in rng.sample(interfaces, rng.randint(0, 2)):
+            interface.children.add(cls)
+        classes.append(cls)
+        types[cls.name] = cls
+    return types
+
+
+def main(argv):
+    n_types = int(argv[1]) if len(argv) > 1 else 50000
+    n_checks = int(argv[2]) if len(argv) > 2 else 2000
+    types = _build(n_types)
+    print("Hierarchy of {} types".format(len(types)))
+
+    start = time.perf_counter()
+    index = java_ast._SubtypeIndex(types)
+    print("{:<28}{:>10.3f} s".format("Building the index", time.perf_counter() - start))
+    for type_object in types.values():
+        type_object.index = index
+
+    rng = random.Random(1)
+    names = sorted(types.keys())
+    # Types without subtypes are not interesting to check against.
+    supertype_names = [name for name in names if len(types[name].children) > 0]
+    pairs = [(types[rng.choice(supertype_names)], types[rng.choice(names)]) for _ in range(n_checks)]
+    start = time.perf_counter()
+    walked = [_walk_compatible(a, b) for a, b in pairs]
+    walk_time = time.perf_counter() - start
+    start = time.perf_counter()
+    indexed = [a.is_compatible(b) for a, b in pairs]
+    index_time = time.perf_counter() - start
+    assert walked == indexed, "The index disagrees with walking the hierarchy."
+    print("{:<28}{:>10.3f} s".format("{} checks, walking".format(n_checks), walk_time))
+    print("{:<28}{:>10.3f} s".format("{} checks, indexed".format(n_checks), index_time))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
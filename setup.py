@@ -1,11 +1,15 @@
+import re
 import sys
 from setuptools import setup
 
 if sys.version_info < (3, 5):
     sys.exit("Python 3.5+ is required for Autobump.")
 
+with open("autobump/__init__.py") as f:
+    version = re.search(r'^__version__ = "(.*)"$', f.read(), re.M).group(1)
+
 setup(name="autobump",
-      version="0.4.1",
+      version=version,
       description="Automatic semantic versioning of projects",
       url="https://github.com/cshtarkov/autobump",
       author="Christian Shtarkov",
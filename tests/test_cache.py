@@ -0,0 +1,266 @@
+import os
+import io
+import unittest
+import tempfile
+
+import autobump
+from autobump import cache, diff
+from autobump.config import config_overrides
+from autobump.common import popen, VersionControlException
+from autobump.handlers import git, python, java_ast, java_native
+
+
+def _run_git(checkout_dir, args):
+    """Run Git inside a directory with a list of arguments."""
+    return_code, _, _ = popen(["git"] + args, cwd=checkout_dir)
+    if return_code != 0:
+        raise VersionControlException("\'git {}\' failed!".format(args))
+
+
+class TestCheckoutCache(unittest.TestCase):
+    """Test reusing checkouts across runs."""
+
+    def setUp(self):
+        self.dir_handle = tempfile.TemporaryDirectory()
+        self.cache_handle = tempfile.TemporaryDirectory()
+        self.dir = self.dir_handle.name
+        _run_git(self.dir, ["init"])
+        _run_git(self.dir, ["config", "user.email", "mock@autobump.com"])
+        _run_git(self.dir, ["config", "user.name", "Mock"])
+        # Each commit adds a file that's a bit over half a megabyte.
+        for name in ["file1", "file2"]:
+            with open(os.path.join(self.dir, name), "w") as f:
+                f.write(name * 200000)
+            _run_git(self.dir, ["add", name])
+            _run_git(self.dir, ["commit", "-m", '"add {}"'.format(name)])
+
+    def tearDown(self):
+        self.dir_handle.cleanup()
+        self.cache_handle.cleanup()
+
+    def cache_config(self, size=2):
+        """Return a context in which the checkout cache is enabled."""
+        return config_overrides({"cache": {"cache_dir": self.cache_handle.name,
+                                           "checkout_cache_size": size}})
+
+    def test_checkout_contents(self):
+        with self.cache_config():
+            handle, location = cache.get_commit(git, self.dir, "HEAD~1")
+        self.assertTrue(os.path.isfile(os.path.join(location, "file1")))
+        self.assertFalse(os.path.isfile(os.path.join(location, "file2")))
+        self.assertFalse(os.path.isdir(os.path.join(location, ".git")))
+        handle.cleanup()
+
+    def test_checkout_ignores_export_attributes(self):
+        with open(os.path.join(self.dir, ".gitattributes"), "w") as f:
+            f.write("file1 export-ignore\n")
+        _run_git(self.dir, ["add", ".gitattributes"])
+        _run_git(self.dir, ["commit", "-m", '"add attributes"'])
+        with self.cache_config():
+            handle, location = cache.get_commit(git, self.dir, "HEAD")
+        self.assertTrue(os.path.isfile(os.path.join(location, "file1")))
+        handle.cleanup()
+
+    def test_checkout_reused(self):
+        with self.cache_config():
+            handle1, location1 = cache.get_commit(git, self.dir, "HEAD")
+            handle1.cleanup()
+            handle2, location2 = cache.get_commit(git, self.dir, git.last_commit(self.dir))
+            handle2.cleanup()
+        self.assertEqual(location1, location2)
+
+    def test_same_commit_twice_at_once(self):
+        with self.cache_config():
+            handle1, location1 = cache.get_commit(git, self.dir, "HEAD")
+            handle2, location2 = cache.get_commit(git, self.dir, git.last_commit(self.dir))
+        self.assertEqual(location1, location2)
+        handle1.cleanup()
+        handle2.cleanup()
+
+    def test_private_checkout_is_a_copy(self):
+        with self.cache_config():
+            handle1, location1 = cache.get_commit(git, self.dir, "HEAD")
+            handle2, location2 = cache.get_commit(git, self.dir, "HEAD", private=True)
+        self.assertNotEqual(location1, location2)
+        self.assertTrue(os.path.isfile(os.path.join(location2, "file2")))
+        handle1.cleanup()
+        handle2.cleanup()
+
+    def test_least_recently_used_evicted(self):
+        with self.cache_config(size=1):
+            handle1, location1 = cache.get_commit(git, self.dir, "HEAD~1")
+            handle1.cleanup()
+            handle2, location2 = cache.get_commit(git, self.dir, "HEAD")
+            handle2.cleanup()
+        self.assertFalse(os.path.exists(location1))
+        self.assertTrue(os.path.exists(location2))
+
+    def test_checkout_in_use_not_evicted(self):
+        with self.cache_config(size=1):
+            handle1, location1 = cache.get_commit(git, self.dir, "HEAD~1")
+            handle2, location2 = cache.get_commit(git, self.dir, "HEAD")
+            self.assertTrue(os.path.exists(location1))
+            handle1.cleanup()
+            handle2.cleanup()
+
+    def test_stale_staging_removed(self):
+        staging = os.path.join(self.cache_handle.name, "checkouts", ".staging-git-dead")
+        os.makedirs(staging)
+        with self.cache_config():
+            handle, _ = cache.get_commit(git, self.dir, "HEAD")
+            handle.cleanup()
+        self.assertFalse(os.path.exists(staging))
+
+    def test_invalid_revision(self):
+        with self.cache_config():
+            self.assertRaises(VersionControlException, cache.get_commit, git, self.dir, "doesntexist")
+
+    def test_export_failure(self):
+        with tempfile.TemporaryDirectory() as export_dir:
+            self.assertRaises(VersionControlException, git.export_commit, self.dir, "0" * 40, export_dir)
+
+
+class TestUnitCache(unittest.TestCase):
+    """Test caching parse results."""
+
+    def setUp(self):
+        self.dir_handle = tempfile.TemporaryDirectory()
+        self.cache_handle = tempfile.TemporaryDirectory()
+        self.dir = self.dir_handle.name
+        sources = [("module_a.py", "def f(a, b=None):\n    a.m()\n\nX = 1\n"),
+                   ("module_b.py", "class C(object):\n    def g(self, c):\n        pass\n"),
+                   ("ClassA.java", "package p;\npublic class ClassA {\n    public int f(ClassB b) { return 1; }\n}\n"),
+                   ("ClassB.java", "package p;\npublic class ClassB extends ClassA {}\n")]
+        for filename, source in sources:
+            with open(os.path.join(self.dir, filename), "w") as f:
+                f.write(source)
+
+    def tearDown(self):
+        self.dir_handle.cleanup()
+        self.cache_handle.cleanup()
+
+    def cache_config(self, size=16):
+        """Return a context in which the parse result cache is enabled."""
+        return config_overrides({"cache": {"cache_dir": self.cache_handle.name,
+                                           "unit_cache_size": size},
+                                 "python": {"type_hinting": False}})
+
+    def assertNoChanges(self, a_units, b_units):
+        changelog = io.StringIO()
+        self.assertEqual(diff.compare_codebases(a_units, b_units, changelog), diff.Bump.patch)
+        self.assertEqual(changelog.getvalue(), "")
+
+    def cached_entries(self):
+        return [f for _, _, files in os.walk(self.cache_handle.name) for f in files if not f.endswith(".lock")]
+
+    def test_python_same_units(self):
+        with config_overrides({"python": {"type_hinting": False}}):
+            uncached = python.codebase_to_units(self.dir)
+        with self.cache_config():
+            first = python.codebase_to_units(self.dir)
+            self.assertEqual(len(self.cached_entries()), 2)
+            second = python.codebase_to_units(self.dir)
+        self.assertNoChanges(uncached, first)
+        self.assertNoChanges(uncached, second)
+
+    def test_java_ast_same_units(self):
+        uncached = java_ast.codebase_to_units(self.dir)
+        with self.cache_config():
+            java_ast.codebase_to_units(self.dir)
+            self.assertEqual(len(self.cached_entries()), 2)
+            cached = java_ast.codebase_to_units(self.dir)
+        self.assertNoChanges(uncached, cached)
+
+    def test_key_depends_on_settings(self):
+        self.assertNotEqual(cache.unit_key("python", "source", True),
+                            cache.unit_key("python", "source", False))
+        self.assertNotEqual(cache.unit_key("python", "source"),
+                            cache.unit_key("java_ast", "source"))
+
+    def test_key_depends_on_version(self):
+        key = cache.unit_key("python", "source")
+        version = autobump.__version__
+        autobump.__version__ = version + "-next"
+        try:
+            self.assertNotEqual(key, cache.unit_key("python", "source"))
+        finally:
+            autobump.__version__ = version
+
+    def test_eviction(self):
+        with self.cache_config():
+            python.codebase_to_units(self.dir)
+        with self.cache_config(size=0):
+            cache.evict_units()
+        self.assertEqual(self.cached_entries(), [])
+
+
+class TestBuildCache(unittest.TestCase):
+    """Test reusing build outputs across runs."""
+
+    def setUp(self):
+        self.dir_handle = tempfile.TemporaryDirectory()
+        self.cache_handle = tempfile.TemporaryDirectory()
+        self.dir = self.dir_handle.name
+        self.builds = os.path.join(self.dir, "builds")
+        # A Java that pretends to inspect the classes it's given.
+        self.java = os.path.join(self.dir, "java")
+        with open(self.java, "w") as f:
+            f.write('#!/bin/sh\nwhile read name; do printf "class\\t%s\\nend\\n" "$name"; done\n')
+        os.chmod(self.java, 0o755)
+
+    def tearDown(self):
+        self.dir_handle.cleanup()
+        self.cache_handle.cleanup()
+
+    def checkout(self, name, source="class A {}"):
+        """Create a source tree, as if checked out."""
+        location = os.path.join(self.dir, name)
+        os.makedirs(location)
+        with open(os.path.join(location, "A.java"), "w") as f:
+            f.write(source)
+        return location
+
+    def build(self, location, build_command=None):
+        """Build a source tree and return its Units.
+
+        The build command notes in 'self.builds' that it was run."""
+        if build_command is None:
+            build_command = 'echo built >> "{}" && mkdir -p out/p && touch out/p/A.class'.format(self.builds)
+        with config_overrides({"cache": {"cache_dir": self.cache_handle.name},
+                               "autobump": {"java": self.java, "javac": "true"},
+                               "java_native": {"inspector_format": "tsv"}}):
+            return java_native.codebase_to_units(location, build_command, "out")
+
+    def build_count(self):
+        with open(self.builds) as f:
+            return len(f.readlines())
+
+    def test_build_reused(self):
+        units1 = self.build(self.checkout("a"))
+        location = self.checkout("b")
+        units2 = self.build(location)
+        self.assertEqual(self.build_count(), 1)
+        self.assertEqual(list(units1), ["p.A"])
+        self.assertEqual(list(units2), ["p.A"])
+        self.assertTrue(os.path.isfile(os.path.join(location, "out", "p", "A.class")))
+
+    def test_source_change_rebuilds(self):
+        self.build(self.checkout("a"))
+        self.build(self.checkout("b", "class A { int x; }"))
+        self.assertEqual(self.build_count(), 2)
+
+    def test_key_depends_on_settings(self):
+        location = self.checkout("a")
+        self.assertEqual(cache.build_key(location, "make"), cache.build_key(location, "make"))
+        self.assertNotEqual(cache.build_key(location, "make"), cache.build_key(location, "mvn compile"))
+        self.assertNotEqual(cache.build_key(location, "make", "classpath"), cache.build_key(location, "make", ""))
+
+    def test_disabled(self):
+        with config_overrides({"cache": {"build_cache_size": 0}}):
+            self.build(self.checkout("a"))
+            self.build(self.checkout("b"))
+        self.assertEqual(self.build_count(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
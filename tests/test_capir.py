@@ -0,0 +1,115 @@
+import pickle
+import unittest
+
+from autobump.capir import Type, Field, Parameter, Signature, Function, Unit
+
+
+class _NamedType(Type):
+    def __init__(self, name):
+        self.name = name
+
+
+class _TypeWithExtras(Type):
+    def __init__(self, name, extra):
+        self.name = name
+        self.extra = extra
+
+
+class _NumberedType(Type):
+    def __init__(self, name, number):
+        self.name = name
+        self.number = number
+
+    def digest(self):
+        return (type(self), self.name, self.number)
+
+
+def _unit():
+    return Unit("U",
+                {"f": Field("f", _NamedType("A"))},
+                {"g": Function("g", _NamedType("R"),
+                               [Signature([Parameter("a", _NamedType("A"), 1)])])},
+                dict())
+
+
+class TestEntities(unittest.TestCase):
+    """Test the common behaviour of entities."""
+
+    def test_no_dict(self):
+        for entity in [Field("f", None), Parameter("p", None), Signature(), Function("g", None), _unit()]:
+            self.assertFalse(hasattr(entity, "__dict__"))
+
+    def test_attributes(self):
+        self.assertEqual(Parameter("p", None, 1).attributes(),
+                         {"name": "p", "type": None, "default_value": 1})
+
+    def test_attributes_of_subclass(self):
+        self.assertEqual(_TypeWithExtras("T", 1).attributes(), {"name": "T", "extra": 1})
+
+    def test_equality(self):
+        self.assertEqual(_unit(), _unit())
+        self.assertNotEqual(Parameter("p", _NamedType("A")), Parameter("p", _NamedType("A"), 1))
+
+    def test_names_interned(self):
+        name = "".join(["na", "me"])
+        self.assertIs(Field(name, None).name, Field("name", None).name)
+
+    def test_pickle(self):
+        unit = _unit()
+        self.assertEqual(pickle.loads(pickle.dumps(unit)), unit)
+
+
+class TestDigest(unittest.TestCase):
+    """Test structural digests of entities."""
+
+    def test_same_structure(self):
+        self.assertEqual(_unit().digest(), _unit().digest())
+
+    def test_changed_type(self):
+        unit = _unit()
+        unit.fields["f"] = Field("f", _NamedType("B"))
+        self.assertNotEqual(unit.digest(), _unit().digest())
+
+    def test_added_default_value(self):
+        a = Signature([Parameter("a", _NamedType("A"))])
+        b = Signature([Parameter("a", _NamedType("A"), 1)])
+        self.assertNotEqual(a.digest(), b.digest())
+
+    def test_only_presence_of_default_value(self):
+        a = Signature([Parameter("a", _NamedType("A"), 1)])
+        b = Signature([Parameter("a", _NamedType("A"), 2)])
+        self.assertEqual(a.digest(), b.digest())
+
+    def test_order_of_overloads(self):
+        a = Signature([Parameter("a", _NamedType("A"))])
+        b = Signature([Parameter("a", _NamedType("B"))])
+        self.assertEqual(Function("g", _NamedType("R"), [a, b]).digest(),
+                         Function("g", _NamedType("R"), [b, a]).digest())
+
+    def test_type_class(self):
+        self.assertNotEqual(_NamedType("A").digest(), _TypeWithExtras("A", 1).digest())
+
+    def test_no_collisions(self):
+        # hash(-1) == hash(-2), so the built-in hash can't tell these apart.
+        a = Signature([Parameter("a", _NumberedType("A", -1))])
+        b = Signature([Parameter("a", _NumberedType("A", -2))])
+        self.assertNotEqual(a.digest(), b.digest())
+        self.assertNotEqual(Unit("U", dict(), {"g": Function("g", _NamedType("R"), [a])}, dict()).digest(),
+                            Unit("U", dict(), {"g": Function("g", _NamedType("R"), [b])}, dict()).digest())
+
+    def test_not_an_attribute(self):
+        unit = _unit()
+        unit.digest()
+        self.assertEqual(unit, _unit())
+        self.assertNotIn("_digest", unit.attributes())
+
+    def test_not_pickled(self):
+        unit = _unit()
+        unit.digest()
+        loaded = pickle.loads(pickle.dumps(unit))
+        self.assertIsNone(loaded._digest)
+        self.assertEqual(loaded, unit)
+
+
+if __name__ == "__main__":
+    unittest.main()
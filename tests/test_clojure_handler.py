@@ -173,5 +173,45 @@ class TestTypes(TestClojureHandlerBase):
         self.assertFalse(parameters[0].type.is_compatible(parameters[2].type))
 
 
+class TestInspectorProcesses(unittest.TestCase):
+    """Test inspecting many files with one or more inspector runs."""
+
+    def setUp(self):
+        self.dir_handle = tempfile.TemporaryDirectory()
+        self.dir = self.dir_handle.name
+        for i in range(4):
+            fullpath = os.path.join(self.dir, "lib", "ns{}.clj".format(i))
+            os.makedirs(os.path.dirname(fullpath), exist_ok=True)
+            with open(fullpath, "w") as f:
+                f.write("(ns lib.ns{})\n(defn f{} [a b])\n".format(i, i))
+
+    def tearDown(self):
+        self.dir_handle.cleanup()
+
+    def inspect(self, processes, omit_on_error=False):
+        with config_overrides({"clojure": {"classpath": self.dir + ":",
+                                           "inspector_processes": processes,
+                                           "omit_on_error": omit_on_error}}):
+            return clojure.codebase_to_units(self.dir)
+
+    def test_one_process(self):
+        self.assertEqual(sorted(self.inspect(1)), ["lib.ns0", "lib.ns1", "lib.ns2", "lib.ns3"])
+
+    def test_several_processes(self):
+        codebase = self.inspect(3)
+        self.assertEqual(sorted(codebase), ["lib.ns0", "lib.ns1", "lib.ns2", "lib.ns3"])
+        self.assertTrue("f2" in codebase["lib.ns2"].functions)
+
+    def test_omit_on_error(self):
+        with open(os.path.join(self.dir, "lib", "ns1.clj"), "w") as f:
+            f.write("(ns lib.ns1)\n(defn broken [a b)\n")
+        self.assertEqual(sorted(self.inspect(1, omit_on_error=True)), ["lib.ns0", "lib.ns2", "lib.ns3"])
+
+    def test_error(self):
+        with open(os.path.join(self.dir, "lib", "ns1.clj"), "w") as f:
+            f.write("(ns lib.ns1)\n(defn broken [a b)\n")
+        self.assertRaises(clojure._ClojureUtilityException, self.inspect, 1)
+
+
 if __name__ == "__main__":
     unittest.main()
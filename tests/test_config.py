@@ -78,6 +78,32 @@ class TestIgnored(unittest.TestCase):
         self.assertTrue(config.entity_ignored("entityname1"))
         self.assertTrue(config.entity_ignored("entityname2"))
 
+    @config_override("ignore", "files", "glob:*.txt\nre:test_\\w+\\.py\n")
+    def test_ignore_patterns(self):
+        self.assertTrue(config.file_ignored("notes.txt"))
+        self.assertTrue(config.file_ignored("test_config.py"))
+        self.assertFalse(config.file_ignored("config.py"))
+        self.assertFalse(config.file_ignored("test_config.pyc"))
+
+    @config_override("ignore", "entities", "Class.method(int[])\nClass.*\n")
+    def test_wildcards_literal(self):
+        self.assertTrue(config.entity_ignored("Class.method(int[])"))
+        self.assertTrue(config.entity_ignored("Class.*"))
+        self.assertFalse(config.entity_ignored("Class.method(int)"))
+        self.assertFalse(config.entity_ignored("Class.field"))
+
+    @config_override("ignore", "entities", "entityname\n")
+    def test_set_invalidates(self):
+        self.assertTrue(config.entity_ignored("entityname"))
+        config.set("ignore", "entities", "othername\n")
+        self.assertFalse(config.entity_ignored("entityname"))
+        self.assertTrue(config.entity_ignored("othername"))
+
+    def test_override_invalidates(self):
+        with config.config_overrides({"ignore": {"entities": "entityname\n"}}):
+            self.assertTrue(config.entity_ignored("entityname"))
+        self.assertFalse(config.entity_ignored("entityname"))
+
 
 class TestOnlyConsider(unittest.TestCase):
     """Test whitelists."""
@@ -97,6 +123,11 @@ class TestOnlyConsider(unittest.TestCase):
         self.assertFalse(config.entity_ignored("Entity"))
         self.assertTrue(config.entity_ignored("AnotherOne"))
 
+    @config_override("only_consider", "entities", "glob:module.*")
+    def test_only_pattern(self):
+        self.assertFalse(config.entity_ignored("module.Class.method"))
+        self.assertTrue(config.entity_ignored("other.Class"))
+
 
 class TestExportConfig(unittest.TestCase):
     """Test exporting the config."""
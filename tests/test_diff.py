@@ -1,7 +1,8 @@
+import logging
 import unittest
 
 from autobump.diff import Bump, compare_codebases
-from autobump.capir import Type, Field, Parameter, Signature, Function
+from autobump.capir import Type, Field, Parameter, Signature, Function, Unit
 
 
 # Mock Type System
@@ -208,5 +209,160 @@ class TestSingleEntities(unittest.TestCase):
         self.expect(Bump.major)
 
 
+class _Prefetched(Type):
+    """Type that records which compatibility checks it was told about,
+    and which ones were actually made."""
+    prefetched = set()
+    checked = set()
+
+    def __init__(self, name):
+        self.name = name
+
+    @classmethod
+    def prefetch_compatibility(cls, pairs):
+        cls.prefetched.update((a.name, b.name) for a, b in pairs)
+
+    def is_compatible(self, other):
+        self.checked.add((self.name, other.name))
+        return self.name == other.name
+
+    # Like handlers whose checks are expensive, doesn't check to compare.
+    def __eq__(self, other):
+        return self.name == other.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+
+class TestPrefetchCompatibility(unittest.TestCase):
+    """Test that type classes are told about compatibility checks in advance."""
+
+    def setUp(self):
+        _Prefetched.prefetched = set()
+        _Prefetched.checked = set()
+
+    def test_all_checks_prefetched(self):
+        first = {"U": Unit("U",
+                           {"f": Field("f", _Prefetched("A"))},
+                           {"g": Function("g", _Prefetched("R"),
+                                          [Signature([Parameter("a", _Prefetched("B"))]),
+                                           Signature([Parameter("a", _Prefetched("C")), Parameter("b", _Prefetched("D"))])])},
+                           dict())}
+        second = {"U": Unit("U",
+                            {"f": Field("f", _Prefetched("E"))},
+                            {"g": Function("g", _Prefetched("R"),
+                                           [Signature([Parameter("a", _Prefetched("F"))]),
+                                            Signature([Parameter("a", _Prefetched("G")), Parameter("b", _Prefetched("D"))])])},
+                            dict())}
+        self.assertEqual(compare_codebases(first, second, None), Bump.major)
+        self.assertEqual(_Prefetched.checked, {("E", "A"), ("F", "B"), ("G", "B"), ("F", "C"), ("G", "C")})
+        self.assertEqual(_Prefetched.prefetched, _Prefetched.checked)
+
+    def test_unchanged_overloads_not_prefetched(self):
+        def codebase(name):
+            return {"g": Function("g", _Prefetched("R"),
+                                  [Signature([Parameter("a", _Prefetched("A"))]),
+                                   Signature([Parameter("a", _Prefetched(name))])])}
+        compare_codebases(codebase("B"), codebase("C"), None)
+        self.assertEqual(_Prefetched.checked, {("C", "B")})
+        self.assertEqual(_Prefetched.prefetched, _Prefetched.checked)
+
+    def test_removed_entities_not_prefetched(self):
+        first = {"f": Field("f", _Prefetched("A"))}
+        second = {"g": Field("g", _Prefetched("B"))}
+        compare_codebases(first, second, None)
+        self.assertEqual(_Prefetched.prefetched, set())
+
+
+class _Uncomparable(Type):
+    """Type that fails when compared."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def is_compatible(self, other):
+        raise AssertionError("Compared {} to {}".format(self, other))
+
+
+class _NumberedType(Type):
+    """Type that is only compatible with types of the same number."""
+
+    def __init__(self, name, number):
+        self.name = name
+        self.number = number
+
+    def is_compatible(self, other):
+        return isinstance(other, _NumberedType) and self.number == other.number
+
+    def digest(self):
+        return (type(self), self.name, self.number)
+
+
+class TestIdenticalEntities(unittest.TestCase):
+    """Test that identical entities aren't compared any further."""
+
+    def codebase(self, extra_field=None):
+        fields = {"f": Field("f", _Uncomparable("A"))}
+        if extra_field is not None:
+            fields[extra_field] = Field(extra_field, _generic)
+        function = Function("g", _Uncomparable("R"),
+                            [Signature([Parameter("a", _Uncomparable("B"))]),
+                             Signature([Parameter("a", _Uncomparable("C"))])])
+        return {"U": Unit("U", fields, {"g": function}, {"V": Unit("V", {"h": Field("h", _Uncomparable("D"))}, dict(), dict())})}
+
+    def test_identical_codebases(self):
+        self.assertEqual(compare_codebases(self.codebase(), self.codebase(), None), Bump.patch)
+
+    def test_identical_subtrees(self):
+        self.assertEqual(compare_codebases(self.codebase(), self.codebase("new"), None), Bump.minor)
+
+    def test_different_subtrees(self):
+        # hash(-1) == hash(-2), so digests built with the built-in hash collide.
+        def codebase(number):
+            function = Function("g", _generic, [Signature([Parameter("a", _NumberedType("A", number))])])
+            return {"U": Unit("U", dict(), {"g": function}, dict())}
+        self.assertEqual(compare_codebases(codebase(-1), codebase(-2), None), Bump.major)
+
+
+class _Unprintable(Type):
+    """Type that fails when turned into a string."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        raise AssertionError("Formatted {}".format(self.name))
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class TestLogging(unittest.TestCase):
+    """Test that nothing is formatted for debug messages
+    unless debug logging is enabled."""
+
+    def codebase(self, version):
+        function = Function("g", _Unprintable("R{}".format(version)),
+                            [Signature([Parameter("a", _Unprintable("B{}".format(version)))]),
+                             Signature([Parameter("a", _Unprintable("C")), Parameter("b", _Unprintable("D"))])])
+        return {"U": Unit("U", {"f": Field("f", _Unprintable("A{}".format(version)))}, {"g": function}, dict())}
+
+    def test_debug_disabled(self):
+        logger = logging.getLogger("autobump.diff")
+        level = logger.level
+        logger.setLevel(logging.INFO)
+        try:
+            self.assertEqual(compare_codebases(self.codebase(1), self.codebase(2), None), Bump.patch)
+        finally:
+            logger.setLevel(level)
+
+    def test_debug_enabled(self):
+        a = {"foo": Field("foo", _a)}
+        b = {"foo": Field("foo", _compatWithA)}
+        with self.assertLogs("autobump.diff", logging.DEBUG) as logs:
+            compare_codebases(a, b, None)
+        self.assertIn("DEBUG:autobump.diff:Comparing foo", logs.output)
+
+
 if __name__ == "__main__":
     unittest.main()
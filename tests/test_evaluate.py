@@ -0,0 +1,130 @@
+import io
+import time
+import argparse
+import unittest
+import threading
+import contextlib
+
+from autobump import evaluate, _revisions_to_units
+from autobump.capir import Type, Field
+from autobump.config import config_overrides
+
+_type = Type()
+
+
+class _Handle(object):
+    def __init__(self, revision, alive):
+        self.revision = revision
+        self.alive = alive
+
+    def cleanup(self):
+        self.alive.remove(self.revision)
+
+
+class _Handler(object):
+    """Language handler whose codebase in every revision
+    has fields with the names listed for it."""
+    build_required = False
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def codebase_to_units(self, location):
+        return {name: Field(name, _type) for name in self.fields[location]}
+
+
+class TestEvaluate(unittest.TestCase):
+    """Test evaluation mode on a history given as fields in each revision."""
+
+    def evaluate(self, history, workers=1):
+        revisions = [revision for revision, _ in history]
+        self.fetched = []
+        self.alive = set()
+        self.most_alive = 0
+        lock = threading.Lock()
+
+        def get_commit(revision):
+            with lock:
+                self.fetched.append(revision)
+                self.alive.add(revision)
+                self.most_alive = max(self.most_alive, len(self.alive))
+            return _Handle(revision, self.alive), revision
+
+        args = argparse.Namespace(f=revisions[0], to=revisions[-1], changelog=None, changelog_stdout=None,
+                                  from_version=None, build_command=None, build_root=None, handler="fake")
+        handlers = (None, None, _Handler(dict(history)), get_commit)
+        self.output = io.StringIO()
+        with contextlib.redirect_stdout(self.output), \
+                config_overrides({"run": {"evaluate_workers": workers}}):
+            return evaluate(args, revisions, handlers)
+
+    def test_revisions_fetched_once(self):
+        history = [("1.0.0", ["a"]),
+                   ("1.1.0", ["a", "b"]),
+                   ("2.0.0", ["b"]),
+                   ("2.0.1", ["b"])]
+        self.assertEqual(self.evaluate(history), 0)
+        self.assertEqual(self.fetched, ["1.0.0", "1.1.0", "2.0.0", "2.0.1"])
+        self.assertEqual(self.most_alive, 2)
+        self.assertEqual(self.alive, set())
+
+    def test_mismatch(self):
+        history = [("1.0.0", ["a"]),
+                   ("2.0.0", ["a", "b"]),
+                   ("2.1.0", ["b"])]
+        self.assertEqual(self.evaluate(history), 2)
+        self.assertEqual(self.fetched, ["1.0.0", "2.0.0", "2.1.0"])
+
+    def test_omitted_interval(self):
+        history = [("1.0.0", ["a"]),
+                   ("1.1.0-rc1", ["a", "b"]),
+                   ("1.1.0", ["a", "b"]),
+                   ("2.0.0", ["b"])]
+        self.assertEqual(self.evaluate(history), 0)
+        self.assertEqual(self.fetched, ["1.0.0", "1.1.0-rc1", "1.1.0", "2.0.0"])
+        self.assertEqual(self.alive, set())
+
+    def test_workers(self):
+        history = [("1.0.0", ["a"])]
+        for minor in range(1, 10):
+            history.append(("1.{}.0".format(minor), ["a"] + ["b{}".format(b) for b in range(minor)]))
+        history.append(("1.9.1", ["a", "b0"]))
+        self.assertEqual(self.evaluate(history), 1)
+        output = self.output.getvalue()
+        self.assertEqual(self.evaluate(history, 4), 1)
+        self.assertEqual(self.output.getvalue(), output)
+        self.assertEqual(sorted(self.fetched), sorted(revision for revision, _ in history))
+        self.assertLessEqual(self.most_alive, 4)
+        self.assertEqual(self.alive, set())
+
+
+class TestRevisionsToUnits(unittest.TestCase):
+    """Test converting revisions concurrently."""
+
+    def test_failure_not_delayed(self):
+        release = threading.Event()
+        alive = set()
+
+        def revision_to_units(revision):
+            if revision == "broken":
+                raise ValueError("Broken revision")
+            alive.add(revision)
+            release.wait(10)
+            return _Handle(revision, alive), revision, dict()
+
+        start = time.perf_counter()
+        with config_overrides({"run": {"parallel_revisions": True}}):
+            with self.assertRaises(ValueError):
+                _revisions_to_units(["slow", "broken"], revision_to_units)
+        # Not held up by the revision that is still being converted.
+        self.assertLess(time.perf_counter() - start, 5)
+        release.set()
+        for _ in range(100):
+            if len(alive) == 0:
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(alive, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,7 +3,7 @@ import unittest
 import tempfile
 
 from autobump.capir import Unit
-from autobump.common import popen, VersionControlException
+from autobump.common import popen, walk, read_source, VersionControlException
 from autobump.handlers import git
 
 
@@ -26,6 +26,16 @@ def mock_transformator(checkout_dir):
     return units
 
 
+def mock_transformator_tree(tree):
+    """Same as 'mock_transformator', but for a tree
+    that has not been checked out."""
+    units = []
+    for _, _, files in walk(tree):
+        for file in files:
+            units.append(Unit(file, [], [], []))
+    return units
+
+
 class TestGitRepoConversion(unittest.TestCase):
     """Test whether the Git handler converts a repo
     to a list of units correctly.
@@ -80,6 +90,56 @@ class TestGitRepoConversion(unittest.TestCase):
         self.assertEqual(len([u for u in units if u.name == "file1"]), 1)
         self.assertEqual(len([u for u in units if u.name == "file2"]), 1)
 
+    def test_tree_current_commit(self):
+        self.one_commit_fixture()
+        handle, location = git.get_tree(self.dir, "HEAD")
+        units = mock_transformator_tree(location)
+        handle.cleanup()
+        self.assertEqual(len([u for u in units if u.name == "file1"]), 1)
+
+    def test_tree_previous_commit(self):
+        self.two_commits_fixture()
+        handle, location = git.get_tree(self.dir, "HEAD~1")
+        units = mock_transformator_tree(location)
+        handle.cleanup()
+        self.assertEqual(len([u for u in units if u.name == "file1"]), 1)
+        self.assertEqual(len([u for u in units if u.name == "file2"]), 0)
+
+    def test_tree_read_contents(self):
+        os.makedirs(os.path.join(self.dir, "dir"))
+        with open(os.path.join(self.dir, "dir", "file1"), "w") as f:
+            f.write("contents of file1")
+        with open(os.path.join(self.dir, "file2"), "w") as f:
+            f.write("contents of file2\n")
+        _run_git(self.dir, ["add", "-A"])
+        _run_git(self.dir, ["commit", "-m", '"first commit"'])
+        handle, location = git.get_tree(self.dir, "HEAD")
+        self.assertEqual(read_source(location, os.path.join("dir", "file1")), "contents of file1")
+        self.assertEqual(read_source(location, "file2"), "contents of file2\n")
+        handle.cleanup()
+
+    def test_tree_prune_dirs(self):
+        os.makedirs(os.path.join(self.dir, "ignored"))
+        with open(os.path.join(self.dir, "ignored", "file1"), "w"):
+            pass
+        with open(os.path.join(self.dir, "file2"), "w"):
+            pass
+        _run_git(self.dir, ["add", "-A"])
+        _run_git(self.dir, ["commit", "-m", '"first commit"'])
+        handle, location = git.get_tree(self.dir, "HEAD")
+        files = []
+        for _, dirs, dir_files in walk(location):
+            dirs[:] = [d for d in dirs if d != "ignored"]
+            files += dir_files
+        handle.cleanup()
+        self.assertEqual(files, ["file2"])
+
+    def test_changed_files(self):
+        self.two_commits_fixture()
+        self.assertEqual(git.changed_files(self.dir, "HEAD~1", "HEAD"), ["file2"])
+        self.assertEqual(git.changed_files(self.dir, "HEAD", "HEAD~1"), ["file2"])
+        self.assertEqual(git.changed_files(self.dir, "HEAD", "HEAD"), [])
+
     @unittest.skipIf("TRAVIS" in os.environ,
                      "Travis ships an outdated version of Git.")
     def test_last_tag(self):
@@ -85,6 +85,22 @@ username = Mock <mock@autobump.com>
         self.assertEqual(len([u for u in units if u.name == "file1"]), 1)
         self.assertEqual(len([u for u in units if u.name == "file2"]), 1)
 
+    def test_export_commit(self):
+        self.two_commits_fixture()
+        with tempfile.TemporaryDirectory() as export_dir:
+            hg.export_commit(self.dir, hg.resolve_commit(self.dir, "0"), export_dir)
+            self.assertEqual(sorted(os.listdir(export_dir)), ["file1"])
+
+    def test_resolve_commit_many_matches(self):
+        self.two_commits_fixture()
+        node = hg.resolve_commit(self.dir, "all()")
+        self.assertEqual(len(node), 40)
+
+    def test_changed_files(self):
+        self.two_commits_fixture()
+        self.assertEqual(hg.changed_files(self.dir, "0", "1"), ["file2"])
+        self.assertEqual(hg.changed_files(self.dir, "1", "1"), [])
+
     def test_last_tag(self):
         self.one_commit_fixture()
         _run_hg(self.dir, ["tag", "v1.0.0"])
@@ -1,7 +1,11 @@
+import io
 import os
 import tempfile
 import unittest
+import threading
 
+from autobump import diff
+from autobump.config import config_override, config_overrides
 from autobump.handlers import java_ast
 from autobump.handlers import java_native
 
@@ -232,6 +236,192 @@ class TestTypesAST(TestJavaHandlerBase):
         self.assertTrue(interface2.is_compatible(subclass))
 
 
+class TestTypeSharingAST(TestJavaHandlerBase):
+
+    def test_same_type_is_shared(self):
+        t1 = self.codebase["packageX.ClassB"].functions["returnsB"].signatures[0].parameters[1].type
+        t2 = self.codebase["packageY.ClassD"].functions["acceptsClassA"].signatures[0].parameters[1].type
+        self.assertIs(t1, t2)
+
+    def test_array_shares_hierarchy(self):
+        t = self.codebase["packageY.ClassD"].functions["acceptsClassA"].signatures[0].parameters[1].type
+        arrayT = self.codebase["packageY.ClassD"].functions["acceptsArrayClassA"].signatures[0].parameters[1].type
+        self.assertEqual(arrayT.dimension, 1)
+        self.assertIs(t.children, arrayT.children)
+
+    def test_superclass_array_compatible_with_subclass_skip_one(self):
+        type_system = java_ast._JavaTypeSystem()
+        hierarchy = [java_ast._JavaType(name) for name in ["packageX.ClassA", "packageY.ClassC", "packageY.ClassD"]]
+        for parent, child in zip(hierarchy, hierarchy[1:]):
+            parent.children.add(child)
+        type_system.types = {t.name: t for t in hierarchy}
+        type_system.finalized = True
+        index = java_ast._SubtypeIndex(type_system.types)
+        for t in hierarchy:
+            t.index = index
+        superclass = type_system.lookup("[packageX.ClassA")
+        subclass = type_system.lookup("[packageY.ClassD")
+        self.assertTrue(superclass.is_compatible(subclass))
+        self.assertFalse(subclass.is_compatible(superclass))
+
+
+class TestSubtypeIndex(unittest.TestCase):
+
+    def hierarchy(self, edges):
+        """Build types from (supertype, subtype) pairs and index them."""
+        types = dict()
+        for parent, child in edges:
+            types.setdefault(parent, java_ast._JavaType(parent))
+            types.setdefault(child, java_ast._JavaType(child))
+            types[parent].children.add(types[child])
+        index = java_ast._SubtypeIndex(types)
+        for t in types.values():
+            t.index = index
+        return types
+
+    def test_interfaces(self):
+        types = self.hierarchy([("Object", "A"), ("Object", "B"), ("A", "C"),
+                                ("IfaceX", "C"), ("IfaceY", "IfaceX"), ("IfaceY", "B")])
+        self.assertTrue(types["Object"].is_compatible(types["C"]))
+        self.assertTrue(types["IfaceX"].is_compatible(types["C"]))
+        self.assertTrue(types["IfaceY"].is_compatible(types["C"]))
+        self.assertTrue(types["IfaceY"].is_compatible(types["B"]))
+        self.assertFalse(types["IfaceX"].is_compatible(types["B"]))
+        self.assertFalse(types["A"].is_compatible(types["B"]))
+        self.assertFalse(types["C"].is_compatible(types["IfaceY"]))
+
+    def test_deep_hierarchy(self):
+        names = ["Class{}".format(i) for i in range(5000)]
+        types = self.hierarchy(zip(names, names[1:]))
+        self.assertTrue(types["Class0"].is_compatible(types["Class4999"]))
+        self.assertFalse(types["Class4999"].is_compatible(types["Class0"]))
+
+    def test_other_codebase(self):
+        # Types from another codebase are looked up by name.
+        a_types = self.hierarchy([("A", "B")])
+        b_types = self.hierarchy([("A", "C"), ("C", "B")])
+        self.assertTrue(a_types["A"].is_compatible(b_types["B"]))
+        self.assertFalse(a_types["A"].is_compatible(b_types["C"]))
+
+    def test_array_types(self):
+        types = self.hierarchy([("A", "B"), ("B", "C")])
+        self.assertTrue(java_ast._JavaType("A", 2, types["A"]).is_compatible(java_ast._JavaType("C", 2, types["C"])))
+        self.assertFalse(java_ast._JavaType("A", 1, types["A"]).is_compatible(java_ast._JavaType("C", 2, types["C"])))
+
+
+class TestImportsAST(unittest.TestCase):
+
+    def codebase(self, sources):
+        with tempfile.TemporaryDirectory() as dir:
+            for filename, source in sources:
+                fullpath = os.path.join(dir, filename)
+                os.makedirs(os.path.dirname(fullpath), exist_ok=True)
+                with open(fullpath, "w") as f:
+                    f.write(source)
+            return java_ast.codebase_to_units(dir)
+
+    def parameter_type(self, codebase, unit, function):
+        return codebase[unit].functions[function].signatures[0].parameters[1].type
+
+    def test_wildcard_import(self):
+        codebase = self.codebase([
+            ("x/A.java", "package x;\npublic class A {}\n"),
+            ("y/B.java", "package y;\nimport x.*;\npublic class B { public void f(A a) {} }\n")])
+        self.assertEqual(self.parameter_type(codebase, "y.B", "f").name, "x.A")
+
+    def test_same_package_before_wildcard_import(self):
+        codebase = self.codebase([
+            ("x/A.java", "package x;\npublic class A {}\n"),
+            ("y/A.java", "package y;\npublic class A {}\n"),
+            ("y/B.java", "package y;\nimport x.*;\npublic class B { public void f(A a) {} }\n")])
+        self.assertEqual(self.parameter_type(codebase, "y.B", "f").name, "y.A")
+
+    def test_import_of_inner_type(self):
+        codebase = self.codebase([
+            ("x/A.java", "package x;\npublic class A { public class Inner {} }\n"),
+            ("y/B.java", "package y;\nimport x.A.Inner;\npublic class B { public void f(Inner a) {} }\n")])
+        self.assertEqual(self.parameter_type(codebase, "y.B", "f").name, "x.A.Inner")
+
+    def test_ambiguous_import(self):
+        self.assertRaises(AssertionError, self.codebase, [
+            ("x/A.java", "package x;\npublic class A {}\n"),
+            ("y/A.java", "package y;\npublic class A {}\n"),
+            ("z/B.java", "package z;\nimport x.A;\nimport y.A;\npublic class B { public void f(A a) {} }\n")])
+
+
+class TestParallelParsingAST(unittest.TestCase):
+    """Test parsing a codebase with a pool of processes."""
+
+    def setUp(self):
+        self.dir_handle = tempfile.TemporaryDirectory()
+        self.dir = self.dir_handle.name
+        os.makedirs(os.path.join(self.dir, "x"))
+        for i in range(10):
+            with open(os.path.join(self.dir, "x", "Class{}.java".format(i)), "w") as f:
+                f.write("package x;\npublic class Class{} {{ public void f(Class0 a) {{}} }}\n".format(i))
+
+    def tearDown(self):
+        self.dir_handle.cleanup()
+
+    def parse(self, workers, omit_on_error=False):
+        with config_overrides({"run": {"parse_workers": workers, "parse_chunksize": 3},
+                               "java_ast": {"omit_on_error": omit_on_error}}):
+            return java_ast.codebase_to_units(self.dir)
+
+    def test_same_as_serial(self):
+        serial = self.parse(1)
+        parallel = self.parse(4)
+        self.assertEqual(list(serial), list(parallel))
+        changelog = io.StringIO()
+        self.assertEqual(diff.compare_codebases(serial, parallel, changelog), diff.Bump.patch)
+        self.assertEqual(changelog.getvalue(), "")
+
+    def test_omit_on_error(self):
+        with open(os.path.join(self.dir, "x", "Class5.java"), "w") as f:
+            f.write("package x;\npublic class {\n")
+        units = self.parse(4, omit_on_error=True)
+        self.assertNotIn("x.Class5", units)
+
+    def test_error(self):
+        with open(os.path.join(self.dir, "x", "Class5.java"), "w") as f:
+            f.write("package x;\npublic class {\n")
+        self.assertRaises(SystemExit, self.parse, 4)
+
+
+class TestDeclarationsOnlyAST(TestJavaHandlerBase):
+
+    def test_same_units(self):
+        with config_overrides({"java_ast": {"declarations_only": True}}):
+            codebase = java_ast.codebase_to_units(self.dir)
+        self.assertEqual(sorted(codebase), sorted(self.codebase_ast))
+        changelog = io.StringIO()
+        self.assertEqual(diff.compare_codebases(self.codebase_ast, codebase, changelog), diff.Bump.patch)
+        self.assertEqual(changelog.getvalue(), "")
+
+
+class TestStripCode(unittest.TestCase):
+
+    def test_code_removed(self):
+        source = ("public class A {\n"
+                  "    /* class { */ static { init(); }\n"
+                  "    public int[] x = {1, 2};\n"
+                  "    public int f(char c) { if (c == '{') { return 1; } return \"}\".length(); }\n"
+                  "    public interface B { default void g() { h(); } }\n"
+                  "}\n")
+        self.assertEqual(java_ast._strip_code(source),
+                         "public class A {\n"
+                         "     static {}\n"
+                         "    public int[] x = {};\n"
+                         "    public int f(char c) {}\n"
+                         "    public interface B { default void g() {} }\n"
+                         "}\n")
+
+    def test_line_breaks_kept(self):
+        source = "public class A {\n    public void f() {\n        g();\n    }\n    public void g( {}\n}\n"
+        self.assertEqual(java_ast._strip_code(source),
+                         "public class A {\n    public void f() {\n\n}\n    public void g( {}\n}\n")
+
+
 class TestTypesNative(TestTypesAST):
 
     def setUp(self):
@@ -245,6 +435,175 @@ class TestTypesNative(TestTypesAST):
                 for parameter in signature.parameters:
                     parameter.type.location = self.dir
 
+    def tearDown(self):
+        java_native.shutdown()
+
+    def test_checker_server_reused(self):
+        self.test_superclass_compatible_with_subclass()
+        self.test_interface_compatible_with_class()
+        self.assertEqual(list(java_native._type_checker_servers), [self.dir])
+
+    def test_compatibility_memoized(self):
+        superclass = self.codebase["packageY.ClassD"].functions["acceptsClassA"].signatures[0].parameters[1].type
+        subclass = self.codebase["packageY.ClassD"].functions["acceptsClassC"].signatures[0].parameters[1].type
+        self.assertTrue(superclass.is_compatible(subclass))
+        self.assertTrue(superclass.is_compatible(subclass))
+        self.assertEqual(java_native._compatibility_memo.hits, 1)
+        self.assertEqual(java_native._compatibility_memo.misses, 1)
+
+    @config_override("java_native", "type_checker_server", False)
+    def test_batch_without_checker_server(self):
+        superclass = self.codebase["packageY.ClassD"].functions["acceptsClassA"].signatures[0].parameters[1].type
+        subclass = self.codebase["packageY.ClassD"].functions["acceptsClassC"].signatures[0].parameters[1].type
+        type(superclass).prefetch_compatibility([(superclass, subclass), (subclass, superclass)])
+        self.assertTrue(superclass.is_compatible(subclass))
+        self.assertFalse(subclass.is_compatible(superclass))
+        self.assertEqual(java_native._compatibility_memo.misses, 0)
+
+    @config_override("java_native", "type_checker_server", False)
+    def test_without_checker_server(self):
+        self.test_superclass_compatible_with_subclass()
+        self.test_subclass_not_compatible_with_superclass()
+        self.assertEqual(java_native._type_checker_servers, {})
+
+
+class TestInspectorOutput(unittest.TestCase):
+    """Test reading the output of the Inspector as it is written."""
+
+    xml = ('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+           '<introspection>'
+           '<class name="p.A">'
+           '<field name="x"><type dimension="0" name="int"/></field>'
+           '<method name="f"><type dimension="0" name="void"/><signature>'
+           '<parameter name="arg0"><type dimension="1" name="java.lang.String"/></parameter>'
+           '</signature></method>'
+           '<class name="p.A$Inner"><field name="y"><type dimension="0" name="long"/></field></class>'
+           '</class>'
+           '<class name="p.B"/>'
+           '</introspection>\n')
+    tsv = ("class\tp.A\n"
+           "field\tx\tint\t0\n"
+           "method\tf\tvoid\t0\tjava.lang.String\t1\n"
+           "class\tp.A$Inner\n"
+           "field\ty\tlong\t0\n"
+           "end\n"
+           "end\n"
+           "class\tp.B\n"
+           "end\n")
+
+    def run_inspector(self, script, format="xml"):
+        """Run _run_inspector with 'java' replaced by a shell script."""
+        with tempfile.TemporaryDirectory() as dir:
+            java = os.path.join(dir, "java")
+            with open(java, "w") as f:
+                f.write("#!/bin/sh\n" + script)
+            os.chmod(java, 0o755)
+            with config_overrides({"autobump": {"java": java, "javac": "true"},
+                                   "java_native": {"inspector_format": format}}):
+                return list(java_native._run_inspector(dir, ["p.A", "p.B"]))
+
+    def test_units(self):
+        units = list(java_native._xml_stream_to_units(io.BytesIO(self.xml.encode("utf-8"))))
+        self.assertEqual([u.name for u in units], ["p.A", "p.B"])
+        self.assertEqual(units[0].fields["x"].type.name, "int")
+        self.assertEqual(units[0].functions["f"].signatures[0].parameters[1].type.dimension, 1)
+        self.assertEqual(list(units[0].units["p.A$Inner"].fields), ["y"])
+
+    def test_run_inspector(self):
+        units = self.run_inspector("cat <<'EOF'\n{}EOF\n".format(self.xml))
+        self.assertEqual([u.name for u in units], ["p.A", "p.B"])
+
+    def test_tsv_same_as_xml(self):
+        xml_units = {u.name: u for u in java_native._xml_stream_to_units(io.BytesIO(self.xml.encode("utf-8")))}
+        tsv_units = {u.name: u for u in java_native._tsv_stream_to_units(io.BytesIO(self.tsv.encode("utf-8")))}
+        self.assertEqual(list(xml_units), list(tsv_units))
+        changelog = io.StringIO()
+        self.assertEqual(diff.compare_codebases(xml_units, tsv_units, changelog), diff.Bump.patch)
+        self.assertEqual(changelog.getvalue(), "")
+
+    def test_run_inspector_tsv(self):
+        units = self.run_inspector('[ "$2" = --tsv ] || exit 1\ncat <<\'EOF\'\n{}EOF\n'.format(self.tsv), "tsv")
+        self.assertEqual([u.name for u in units], ["p.A", "p.B"])
+
+    def test_class_names_on_stdin(self):
+        units = self.run_inspector('[ "$#" = 3 ] || exit 1\n'
+                                   'while read name; do printf "class\\t%s\\nend\\n" "$name"; done\n', "tsv")
+        self.assertEqual([u.name for u in units], ["p.A", "p.B"])
+
+    def test_inspector_processes(self):
+        with tempfile.TemporaryDirectory() as dir:
+            names = ["p.Class{}".format(i) for i in range(7)]
+            os.makedirs(os.path.join(dir, "classes", "p"))
+            for name in names:
+                open(os.path.join(dir, "classes", "p", name[2:] + ".class"), "w").close()
+            java = os.path.join(dir, "java")
+            with open(java, "w") as f:
+                f.write('#!/bin/sh\necho run >> "{}"\n'
+                        'while read name; do printf "class\\t%s\\nend\\n" "$name"; done\n'
+                        .format(os.path.join(dir, "runs")))
+            os.chmod(java, 0o755)
+            with config_overrides({"autobump": {"java": java, "javac": "true"},
+                                   "java_native": {"inspector_format": "tsv", "inspector_processes": 3}}):
+                units = java_native.codebase_to_units(dir, "true", "classes")
+            with open(os.path.join(dir, "runs")) as f:
+                self.assertEqual(len(f.readlines()), 3)
+        self.assertEqual(sorted(units), names)
+
+    def test_tsv_cut_short(self):
+        self.assertRaises(ValueError, list, java_native._tsv_stream_to_units(io.BytesIO(self.tsv[:40].encode("utf-8"))))
+
+    def test_inspector_failure(self):
+        with self.assertRaises(java_native.JavaUtilityException) as context:
+            self.run_inspector("printf '<introspection><class name=\"p.A\">'\necho 'Inspector: failed' >&2\nexit 1\n")
+        self.assertEqual(str(context.exception), "Inspector: failed")
+
+
+class TestJavaNativeType(unittest.TestCase):
+    """Test Java types from compiled classes."""
+
+    def test_equality_without_checker(self):
+        # Without a location, asking the TypeCompatibilityChecker would fail.
+        self.assertEqual(java_native._JavaNativeType("p.A"), java_native._JavaNativeType("p.A"))
+        self.assertNotEqual(java_native._JavaNativeType("p.A"), java_native._JavaNativeType("p.B"))
+        self.assertNotEqual(java_native._JavaNativeType("p.A"), java_native._JavaNativeType("p.A", 1))
+
+
+class TestUtilityBasedir(unittest.TestCase):
+    """Test compiling utilities that haven't been compiled."""
+
+    def test_compiled_once(self):
+        with tempfile.TemporaryDirectory() as dir:
+            libexec = os.path.join(dir, "libexec")
+            os.mkdir(libexec)
+            open(os.path.join(libexec, "Utility.java"), "w").close()
+            calls = os.path.join(dir, "calls")
+            javac = os.path.join(dir, "javac")
+            # Fails to compile in place, so that a tempdir is used.
+            with open(javac, "w") as f:
+                f.write("#!/bin/sh\necho >> {}\nsleep 0.1\ntest \"$PWD\" != {}\n".format(calls, libexec))
+            os.chmod(javac, 0o755)
+            saved_libexec = java_native.libexec
+            java_native.libexec = libexec
+            try:
+                basedirs = []
+                with config_overrides({"autobump": {"javac": javac}}):
+                    threads = [threading.Thread(target=lambda: basedirs.append(java_native._utility_basedir("Utility")))
+                               for _ in range(4)]
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+                self.assertEqual(len(basedirs), 4)
+                self.assertEqual(len(set(basedirs)), 1)
+                self.assertNotEqual(basedirs[0], libexec)
+                with open(calls) as f:
+                    self.assertEqual(len(f.readlines()), 2)
+            finally:
+                java_native.libexec = saved_libexec
+                dir_handle = java_native._utility_dirs.pop("Utility", None)
+                if dir_handle is not None:
+                    dir_handle.cleanup()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,7 +1,12 @@
+import io
+import os
 import ast
 import unittest
+import tempfile
 
-from autobump.config import config_override
+from autobump import diff
+from autobump.common import RestrictedTree
+from autobump.config import config_override, config_overrides
 from autobump.handlers import python
 
 
@@ -306,6 +311,85 @@ def func2(b):
         self.assertFalse(type_of_a.is_compatible(type_of_b))
         self.assertFalse(type_of_b.is_compatible(type_of_a))
 
+    @config_override("python", "structural_typing", True)
+    @config_override("python", "type_hinting", True)
+    def test_all_parameters(self):
+        source = """
+def func(self, a, b, c: int, d):
+    a.m1(b.m2, [x.m3 for x in d.items])
+    if a.f1:
+        lambda: c.m4 + b.m5()
+"""
+        codebase = _source_to_unit(source)
+        types = [p.type for p in codebase.functions["func"].signatures[0].parameters]
+        self.assertEqual(types[0].attr_set, set())
+        self.assertEqual(types[1].attr_set, {"m1", "f1"})
+        self.assertEqual(types[2].attr_set, {"m2", "m5"})
+        self.assertEqual(types[3].name, "int")
+        self.assertEqual(types[4].attr_set, {"items"})
+
+
+class TestRestrictedCodebase(unittest.TestCase):
+    """Test converting only some files of a codebase,
+    as done in incremental mode."""
+
+    @config_override("python", "type_hinting", False)
+    def test_only_listed_files(self):
+        with tempfile.TemporaryDirectory() as dir:
+            os.makedirs(os.path.join(dir, "package"))
+            for path in ["module_a.py", "module_b.py", os.path.join("package", "module_c.py")]:
+                with open(os.path.join(dir, path), "w") as f:
+                    f.write("def f():\n    pass\n")
+            units = python.codebase_to_units(RestrictedTree(dir, ["module_b.py", "package/module_c.py"]))
+        self.assertEqual(sorted(units), ["module_b", "module_c"])
+
+
+class TestParallelParsing(unittest.TestCase):
+    """Test parsing a codebase with a pool of processes."""
+
+    def setUp(self):
+        self.dir_handle = tempfile.TemporaryDirectory()
+        self.dir = self.dir_handle.name
+        for i in range(10):
+            with open(os.path.join(self.dir, "module_{}.py".format(i)), "w") as f:
+                f.write("X = 1\n\ndef f(a, b=None):\n    a.m{}()\n\nclass C(object):\n    def g(self):\n        pass\n".format(i))
+
+    def tearDown(self):
+        self.dir_handle.cleanup()
+
+    def parse(self, workers, **python_options):
+        python_options["type_hinting"] = False
+        with config_overrides({"run": {"parse_workers": workers, "parse_chunksize": 3},
+                               "python": python_options}):
+            return python.codebase_to_units(self.dir)
+
+    def test_same_as_serial(self):
+        serial = self.parse(1)
+        parallel = self.parse(4)
+        self.assertEqual(list(serial), list(parallel))
+        changelog = io.StringIO()
+        self.assertEqual(diff.compare_codebases(serial, parallel, changelog), diff.Bump.patch)
+        self.assertEqual(changelog.getvalue(), "")
+
+    def test_changes_detected(self):
+        serial = self.parse(1)
+        with open(os.path.join(self.dir, "module_3.py"), "a") as f:
+            f.write("\ndef h():\n    pass\n")
+        parallel = self.parse(4)
+        self.assertEqual(diff.compare_codebases(serial, parallel, io.StringIO()), diff.Bump.minor)
+
+    def test_omit_on_error(self):
+        with open(os.path.join(self.dir, "module_5.py"), "w") as f:
+            f.write("def (:\n")
+        units = self.parse(4, omit_on_error=True)
+        self.assertNotIn("module_5", units)
+        self.assertEqual(len(units), 9)
+
+    def test_error(self):
+        with open(os.path.join(self.dir, "module_5.py"), "w") as f:
+            f.write("def (:\n")
+        self.assertRaises(SystemExit, self.parse, 4)
+
 
 if __name__ == "__main__":
     unittest.main()